@@ -0,0 +1,157 @@
+import os
+import re
+import csv
+import glob
+import json
+import shutil
+import sqlite3
+import subprocess
+
+# Backends interchangeables pour les trois services externes du pipeline :
+#   - données de référence : PostgreSQL (psycopg2)   | SQLite
+#   - stockage brut        : HDFS via 'docker exec'  | dossier local
+#   - moteur de requête    : Trino                   | agrégation Python sur le dossier local
+# Le choix se fait par configuration (PIPELINE_BACKEND dans utils.py).
+
+# --- 1. DONNÉES DE RÉFÉRENCE ---
+
+class _SQLiteCursor:
+    """Curseur SQLite qui accepte le SQL écrit pour psycopg2 (paramètres %s, DROP ... CASCADE)"""
+    def __init__(self, cur):
+        self._cur = cur
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._cur.close()
+
+    def execute(self, query, params=()):
+        query = query.replace("%s", "?").replace(" CASCADE", "")
+        self._cur.execute(query, params)
+
+    def executemany(self, query, seq):
+        self._cur.executemany(query.replace("%s", "?"), seq)
+
+    def fetchall(self):
+        return self._cur.fetchall()
+
+class SQLiteConnection:
+    """Remplace psycopg2.connect() pour les données de référence"""
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path)
+
+    def cursor(self):
+        return _SQLiteCursor(self._conn.cursor())
+
+    def commit(self):
+        self._conn.commit()
+
+    def close(self):
+        self._conn.close()
+
+# --- 2. STOCKAGE (HDFS) ---
+
+class DockerHdfs:
+    """HDFS du conteneur 'namenode', piloté par 'docker exec' / 'docker cp'"""
+
+    def put_dir(self, local_dir, target):
+        """Remplace le dossier HDFS 'target' par le contenu de 'local_dir'"""
+        parent = os.path.dirname(target)
+        tmp_path = f"/tmp/{target.strip('/').replace('/', '_')}"
+        subprocess.run(f"docker exec namenode hdfs dfs -rm -r -f {target}", shell=True)
+        subprocess.run(f"docker exec namenode hdfs dfs -mkdir -p {parent}", shell=True)
+        # Astuce: On copie via un tmp dans le conteneur
+        subprocess.run(f"docker exec namenode rm -rf {tmp_path}", shell=True)
+        subprocess.run(f"docker cp \"{local_dir}\" namenode:\"{tmp_path}\"", shell=True)
+        subprocess.run(f"docker exec namenode hdfs dfs -put \"{tmp_path}\" {target}", shell=True)
+        subprocess.run(f"docker exec namenode rm -rf {tmp_path}", shell=True)
+
+    def list_dirs(self, pattern):
+        """Dossiers HDFS qui correspondent au glob (métadonnées seules). None si le listing échoue."""
+        ls = subprocess.run(f"docker exec namenode hdfs dfs -ls -d '{pattern}'",
+                            shell=True, capture_output=True, text=True)
+        if ls.returncode != 0:
+            return None
+        return [l.split(None, 7)[-1] for l in ls.stdout.splitlines() if l.startswith("d")]
+
+    def describe_files(self, paths, globs):
+        """Une ligne par fichier (taille, date, chemin) + checksums HDFS. None si le listing échoue."""
+        ls = subprocess.run(f"docker exec namenode hdfs dfs -ls -R {' '.join(paths)}",
+                            shell=True, capture_output=True, text=True)
+        # Les globs sont entre quotes : c'est HDFS qui les étend, pas le shell local
+        quoted_globs = " ".join(f"'{g}'" for g in globs)
+        checksum = subprocess.run(f"docker exec namenode hdfs dfs -checksum {quoted_globs}",
+                                  shell=True, capture_output=True, text=True)
+        if ls.returncode != 0 or checksum.returncode != 0:
+            return None
+        # Seuls les fichiers comptent (les lignes de dossiers commencent par 'd')
+        lines = [l.split(None, 4)[-1] for l in ls.stdout.splitlines() if l.startswith("-")]
+        return lines + checksum.stdout.splitlines()
+
+class LocalHdfs:
+    """Dossier local qui reproduit l'arborescence HDFS (/raw/..., /output/...)"""
+    def __init__(self, root):
+        self.root = root
+
+    def local_path(self, hdfs_path):
+        return os.path.join(self.root, hdfs_path.lstrip("/"))
+
+    def put_dir(self, local_dir, target):
+        dest = self.local_path(target)
+        if os.path.exists(dest): shutil.rmtree(dest)
+        shutil.copytree(local_dir, dest)
+
+    def list_dirs(self, pattern):
+        return ["/" + os.path.relpath(p, self.root).replace(os.sep, "/")
+                for p in glob.glob(self.local_path(pattern)) if os.path.isdir(p)]
+
+    def describe_files(self, paths, globs):
+        lines = []
+        for g in globs:
+            for path in glob.glob(self.local_path(g)):
+                if os.path.isfile(path):
+                    st = os.stat(path)
+                    lines.append(f"{st.st_size} {st.st_mtime_ns} {path}")
+        return lines or None
+
+# --- 3. MOTEUR DE REQUÊTE ---
+
+def local_aggregation(storage, date_str, snapshot_mode="full"):
+    """Équivalent local de la requête d'agrégation Trino : (sku, total_sold, total_avail, total_reserved)"""
+    sold = {}
+    for path in glob.glob(storage.local_path(f"/raw/orders/dt={date_str}/*/*")):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                for item in json.loads(line)["items"]:
+                    sold[item["sku"]] = sold.get(item["sku"], 0) + item["quantity"]
+
+    positions = {}
+    if snapshot_mode == "delta":
+        # Reconstruction : dernier checkpoint <= date, puis deltas appliqués dans l'ordre des dates
+        parts = []
+        for path in glob.glob(storage.local_path("/raw/inventory_delta/dt=*/kind=*/*")):
+            dt, kind = re.search(r"dt=([0-9-]+)[/\\]kind=(\w+)", path).groups()
+            if dt <= date_str:
+                parts.append((dt, kind, path))
+        checkpoints = [dt for dt, kind, _ in parts if kind == "full"]
+        start = max(checkpoints) if checkpoints else date_str
+        files = sorted(p for p in parts if p[0] >= start)
+    else:
+        files = [(date_str, "full", p) for p in glob.glob(storage.local_path(f"/raw/inventory/dt={date_str}/*"))]
+    for _, _, path in files:
+        with open(path, newline="") as f:
+            reader = csv.reader(f)
+            next(reader)
+            for wh_id, sku, avail, reserved in reader:
+                positions[(wh_id, sku)] = (int(avail), int(reserved))
+
+    avail, reserved = {}, {}
+    for (_, sku), (a, r) in positions.items():
+        avail[sku] = avail.get(sku, 0) + a
+        reserved[sku] = reserved.get(sku, 0) + r
+
+    # FULL OUTER JOIN sur le sku
+    return [(sku, sold.get(sku, 0), avail.get(sku, 0), reserved.get(sku, 0))
+            for sku in sorted(set(sold) | set(avail))]
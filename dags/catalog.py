@@ -0,0 +1,134 @@
+import io
+import os
+import csv
+import math
+import random
+
+# Données de référence (Master Data) : le catalogue de démo et un générateur
+# paramétrable pour les tests de charge (N fournisseurs, M SKU, K magasins).
+# Les tuples ont la même forme dans les deux cas :
+#   supplier = (supplier_id, name, city)
+#   product  = (sku, name, price, supplier_id, safety_stock, moq)
+#   store    = (store_id, name)
+
+# --- 1. CATALOGUE DE DÉMO ---
+SUPPLIERS = [
+    ("SUP-001", "Les Eaux Minérales d'Oulmès", "Casablanca"),
+    ("SUP-002", "Centrale Danone", "Casablanca"),
+    ("SUP-003", "Dari Couspate", "Salé"),
+    ("SUP-004", "Cosumar", "Casablanca"),
+    ("SUP-005", "Dislog Group", "Casablanca")
+]
+
+MOROCCAN_PRODUCTS = [
+    # SKU, Name, Price, SupplierID, SafetyStock, MOQ
+    ("PRD-001", "Sidi Ali 1.5L", 6.50, "SUP-001", 100, 50),
+    ("PRD-002", "Oulmes 1L", 7.00, "SUP-001", 80, 40),
+    ("PRD-003", "Couscous Dari 1kg", 13.50, "SUP-003", 50, 20),
+    ("PRD-004", "Thé Sultan Vert", 18.00, "SUP-004", 60, 20),
+    ("PRD-005", "Aicha Confiture Fraise", 22.00, "SUP-005", 30, 10),
+    ("PRD-006", "Lait Centrale Danone", 3.50, "SUP-002", 200, 100),
+    ("PRD-007", "Raibi Jamila", 2.50, "SUP-002", 250, 100),
+    ("PRD-008", "Huile d'Olive Al Horra", 65.00, "SUP-005", 20, 10),
+    ("PRD-009", "Fromage La Vache Qui Rit", 15.00, "SUP-005", 40, 20),
+    ("PRD-010", "Merendina", 2.00, "SUP-005", 300, 50),
+    ("PRD-011", "Pasta Tria", 8.00, "SUP-003", 60, 20),
+    ("PRD-012", "Sardines Titus", 5.50, "SUP-005", 80, 20),
+    ("PRD-013", "Coca-Cola 1L", 9.00, "SUP-005", 150, 30),
+    ("PRD-014", "Atay Sebou", 14.00, "SUP-004", 50, 10),
+    ("PRD-015", "Eau Ciel 5L", 12.00, "SUP-005", 40, 10)
+]
+
+STORES = [
+    ("STORE-CAS-01", "Marjane Californie"),
+    ("STORE-CAS-02", "Morocco Mall"),
+    ("STORE-RAB-01", "Marjane Hay Riad"),
+    ("STORE-TNG-01", "Socco Alto"),
+    ("STORE-MAR-01", "Menara Mall"),
+    ("STORE-AGA-01", "Carrefour Agadir"),
+    ("STORE-FES-01", "Borj Fez")
+]
+
+# --- 2. GÉNÉRATEUR POUR LES TESTS DE CHARGE ---
+CITIES = [
+    ("CAS", "Casablanca"), ("RAB", "Rabat"), ("TNG", "Tanger"), ("MAR", "Marrakech"),
+    ("AGA", "Agadir"), ("FES", "Fès"), ("MEK", "Meknès"), ("OUJ", "Oujda"), ("KEN", "Kénitra"), ("TET", "Tétouan")
+]
+CHAINS = ["Marjane", "Carrefour", "BIM", "Label'Vie", "Aswak Assalam"]
+CATEGORIES = ["Eau", "Lait", "Couscous", "Thé", "Confiture", "Huile", "Fromage", "Biscuit", "Pâtes", "Sardines", "Soda", "Café"]
+FORMATS = ["250g", "500g", "1kg", "33cl", "1L", "1.5L", "5L", "x6", "x12"]
+PACK_SIZES = [6, 10, 12, 20, 24, 50, 100]
+
+def generate_catalog(n_suppliers, n_skus, n_stores, seed=0):
+    """Catalogue synthétique aux distributions réalistes :
+    - la taille des fournisseurs suit une loi de Zipf (quelques grands groupes, une longue traîne) ;
+    - les prix suivent une loi log-normale (médiane ~12 MAD) ;
+    - le stock de sécurité baisse avec le prix (produits chers = rotation lente) ;
+    - le MOQ est un multiple d'une taille de colis, de l'ordre de la moitié du stock de sécurité."""
+    rng = random.Random(seed)
+    id_width = max(3, len(str(max(n_suppliers, n_skus))))
+
+    suppliers = [
+        (f"SUP-{i:0{id_width}d}", f"{rng.choice(CATEGORIES)} Distribution {i}", rng.choice(CITIES)[1])
+        for i in range(1, n_suppliers + 1)
+    ]
+    supplier_weights = [1.0 / rank for rank in range(1, n_suppliers + 1)]
+    supplier_ids = rng.choices([s[0] for s in suppliers], weights=supplier_weights, k=n_skus)
+
+    products = []
+    for i in range(1, n_skus + 1):
+        price = round(min(500.0, max(1.0, rng.lognormvariate(math.log(12), 0.8))), 2)
+        safety = max(5, int(rng.lognormvariate(math.log(600 / math.sqrt(price)), 0.5)))
+        pack = rng.choice(PACK_SIZES)
+        moq = max(pack, int(round(safety * rng.uniform(0.3, 0.7) / pack)) * pack)
+        name = f"{rng.choice(CATEGORIES)} {rng.choice(FORMATS)} #{i}"
+        products.append((f"PRD-{i:0{id_width}d}", name, price, supplier_ids[i - 1], safety, moq))
+
+    # Les magasins suivent aussi une répartition inégale entre villes (Casablanca en tête)
+    city_weights = [1.0 / rank for rank in range(1, len(CITIES) + 1)]
+    store_width = max(2, len(str(n_stores)))
+    stores = []
+    for i, (code, city) in enumerate(rng.choices(CITIES, weights=city_weights, k=n_stores), start=1):
+        stores.append((f"STORE-{code}-{i:0{store_width}d}", f"{rng.choice(CHAINS)} {city} {i}"))
+    return suppliers, products, stores
+
+def get_catalog():
+    """Catalogue de démo, ou catalogue généré si CATALOG_SKUS / CATALOG_SUPPLIERS / CATALOG_STORES sont définis"""
+    if not any(os.environ.get(k) for k in ("CATALOG_SUPPLIERS", "CATALOG_SKUS", "CATALOG_STORES")):
+        return SUPPLIERS, MOROCCAN_PRODUCTS, STORES
+    return generate_catalog(
+        int(os.environ.get("CATALOG_SUPPLIERS", 50)),
+        int(os.environ.get("CATALOG_SKUS", 10000)),
+        int(os.environ.get("CATALOG_STORES", 500)),
+        seed=int(os.environ.get("CATALOG_SEED", 0)),
+    )
+
+# --- 3. CHARGEMENT EN MASSE ---
+
+def catalog_tables(suppliers, products, stores):
+    """Lignes de chaque table Postgres, dans l'ordre de création"""
+    return {
+        "suppliers": suppliers,
+        "products": [(p[0], p[1], p[2], p[3]) for p in products],
+        "replenishment_rules": [(p[0], p[4], p[5]) for p in products],
+        "warehouses": [(f"WH-{s[0]}", s[0]) for s in stores],
+        "stores": stores,
+    }
+
+def bulk_insert(cur, table, rows):
+    """COPY FROM STDIN sur Postgres (une seule commande), executemany sinon (SQLite)"""
+    if hasattr(cur, "copy_expert"):
+        buf = io.StringIO()
+        csv.writer(buf).writerows(rows)
+        buf.seek(0)
+        cur.copy_expert(f"COPY {table} FROM STDIN WITH (FORMAT csv)", buf)
+    else:
+        width = len(rows[0]) if rows else 0
+        cur.executemany(f"INSERT INTO {table} VALUES ({', '.join(['%s'] * width)})", rows)
+
+def write_catalog_csv(suppliers, products, stores, directory):
+    """Écrit un CSV par table (chargeable par COPY ... FROM ... WITH (FORMAT csv))"""
+    os.makedirs(directory, exist_ok=True)
+    for table, rows in catalog_tables(suppliers, products, stores).items():
+        with open(os.path.join(directory, f"{table}.csv"), "w", newline="", encoding="utf-8") as f:
+            csv.writer(f).writerows(rows)
@@ -0,0 +1,48 @@
+import os
+import pickle
+import shutil
+
+# Reprise de la génération après un échec.
+# La journée est découpée en chunks de commandes, tous ajoutés au même fichier
+# orders.json de chaque partition store_id=... Après chaque chunk, state.pkl (état RNG,
+# cumuls nécessaires à la suite, numéro du chunk et taille de chaque fichier) est
+# remplacé atomiquement. Un retry recharge l'état du dernier chunk terminé, tronque
+# chaque fichier à sa taille d'alors et réécrit uniquement le chunk interrompu :
+# la sortie est identique octet par octet à un run sans échec.
+# L'état liste aussi les fichiers écrits et leur taille : s'ils ont disparu ou raccourci
+# (dossier supprimé, nettoyage manuel), l'état est ignoré et la journée est regénérée.
+
+class GenerationCheckpoint:
+    def __init__(self, directory, config):
+        self.directory = directory
+        # Paramètres qui déterminent la sortie : s'ils changent, l'état sauvegardé n'est plus valable
+        self.config = config
+
+    def load(self):
+        """État du dernier chunk terminé, ou None s'il faut repartir de zéro"""
+        try:
+            with open(os.path.join(self.directory, "state.pkl"), "rb") as f:
+                state = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        if state.get("config") != self.config:
+            return None
+        missing = [path for path, size in state.get("files", {}).items()
+                   if not os.path.exists(path) or os.path.getsize(path) < size]
+        if missing:
+            print(f"Checkpoint ignored: {len(missing)} output files missing or truncated (e.g. {missing[0]}).")
+            return None
+        return state
+
+    def save(self, chunk, state, files=None, complete=False):
+        """'files' : {chemin: taille} des fichiers écrits jusqu'ici, vérifiés au prochain load().
+        'complete' marque le dernier chunk : il ne reste plus rien à générer."""
+        os.makedirs(self.directory, exist_ok=True)
+        state = dict(state, chunk=chunk, config=self.config, files=files or {}, complete=complete)
+        tmp = os.path.join(self.directory, "state.pkl.tmp")
+        with open(tmp, "wb") as f:
+            pickle.dump(state, f)
+        os.replace(tmp, os.path.join(self.directory, "state.pkl"))
+
+    def reset(self):
+        if os.path.exists(self.directory): shutil.rmtree(self.directory)
@@ -0,0 +1,110 @@
+import os
+from collections import OrderedDict
+
+# Écriture partitionnée (une partition = un dossier store_id=... d'une date) :
+#   - chaque partition accumule ses lignes en mémoire et les écrit par gros blocs ;
+#   - un pool LRU borne le nombre de fichiers ouverts en même temps ;
+#   - au-delà du plafond mémoire, les plus gros buffers sont vidés en premier.
+# Avec 10k magasins, on garde quelques centaines de descripteurs et on fait
+# une écriture par bloc au lieu d'une écriture par commande.
+# checkpoint() renvoie la taille de chaque fichier : une reprise repart de ces offsets
+# (fichiers tronqués puis complétés en ajout), un seul fichier par partition et par jour.
+
+class PartitionWriter:
+    def __init__(self, base_dir, filename, partitions=None, max_open_files=256,
+                 block_size=1024 * 1024, memory_limit=64 * 1024 * 1024, offsets=None):
+        self.base_dir = base_dir
+        self.filename = filename
+        self.max_open_files = max_open_files
+        self.block_size = block_size
+        self.memory_limit = memory_limit
+        # Partitions déclarées : un fichier (éventuellement vide) est garanti pour chacune
+        self.partitions = list(partitions or [])
+
+        self._buffers = {}
+        self._buffer_sizes = {}
+        self._buffered = 0
+        self._handles = OrderedDict()
+        # Partitions déjà ouvertes pendant ce run : la première ouverture tronque, les suivantes ajoutent
+        self._started = set()
+        self.flushes = 0
+
+        # Reprise : chaque partition est ramenée à l'offset sauvegardé, les lignes suivantes sont ajoutées
+        for key, offset in (offsets or {}).items():
+            os.truncate(self.path(key), offset)
+            self._started.add(key)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def path(self, key):
+        return os.path.join(self.base_dir, key, self.filename)
+
+    def write(self, key, line):
+        buf = self._buffers.get(key)
+        if buf is None:
+            buf = self._buffers[key] = []
+            self._buffer_sizes[key] = 0
+        buf.append(line)
+        self._buffer_sizes[key] += len(line)
+        self._buffered += len(line)
+
+        if self._buffer_sizes[key] >= self.block_size:
+            self._flush(key)
+        if self._buffered > self.memory_limit:
+            # On redescend à la moitié du plafond en vidant les plus gros buffers
+            for k in sorted(self._buffer_sizes, key=self._buffer_sizes.get, reverse=True):
+                if self._buffered <= self.memory_limit // 2:
+                    break
+                self._flush(k)
+
+    def _handle(self, key):
+        f = self._handles.get(key)
+        if f is not None:
+            self._handles.move_to_end(key)
+            return f
+        if len(self._handles) >= self.max_open_files:
+            _, oldest = self._handles.popitem(last=False)
+            oldest.close()
+        path = self.path(key)
+        if key not in self._started:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        f = open(path, "a" if key in self._started else "w", encoding="utf-8")
+        self._started.add(key)
+        self._handles[key] = f
+        return f
+
+    def _flush(self, key):
+        buf = self._buffers.pop(key, None)
+        if not buf:
+            return
+        self._buffered -= self._buffer_sizes.pop(key)
+        self._handle(key).write("".join(buf))
+        self.flushes += 1
+
+    def checkpoint(self):
+        """Écrit tout ce qui est en mémoire et renvoie {partition: taille du fichier}"""
+        for key in list(self._buffers):
+            self._flush(key)
+        for f in self._handles.values():
+            f.flush()
+        self._create_declared()
+        return {key: os.path.getsize(self.path(key)) for key in sorted(self._started)}
+
+    def close(self):
+        for key in list(self._buffers):
+            self._flush(key)
+        for f in self._handles.values():
+            f.close()
+        self._handles.clear()
+        self._create_declared()
+
+    def _create_declared(self):
+        for key in self.partitions:
+            if key not in self._started:
+                os.makedirs(os.path.dirname(self.path(key)), exist_ok=True)
+                open(self.path(key), "w").close()
+                self._started.add(key)
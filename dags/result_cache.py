@@ -0,0 +1,57 @@
+import os
+import json
+import time
+import hashlib
+
+# Cache local des résultats d'agrégation Trino.
+# Une entrée par date : {"fp": empreinte des partitions lues, "rows": [...], "used": timestamp}.
+# L'empreinte est calculée par l'appelant (liste des fichiers, tailles, dates, checksums) :
+# si un seul fichier d'entrée change, l'empreinte change et l'entrée est ignorée puis remplacée.
+
+DEFAULT_MAX_BYTES = 2 * 1024 * 1024
+
+def fingerprint(lines):
+    """Empreinte stable d'un listing de fichiers (ordre indifférent)"""
+    h = hashlib.sha256()
+    for line in sorted(lines):
+        h.update(line.encode("utf-8"))
+        h.update(b"\n")
+    return h.hexdigest()
+
+def _load(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        # Fichier absent ou corrompu : on repart d'un cache vide
+        return {}
+
+def _save(path, entries, max_bytes):
+    # Éviction LRU jusqu'à passer sous la taille maximale
+    payload = json.dumps(entries, separators=(",", ":"))
+    for key in sorted(entries, key=lambda k: entries[k]["used"]):
+        if len(payload) <= max_bytes:
+            break
+        del entries[key]
+        payload = json.dumps(entries, separators=(",", ":"))
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(payload)
+    os.replace(tmp, path)
+
+def cache_get(path, key, fp, max_bytes=DEFAULT_MAX_BYTES):
+    """Renvoie les lignes en cache si l'empreinte correspond, sinon None"""
+    entries = _load(path)
+    entry = entries.get(key)
+    if entry is None or entry["fp"] != fp:
+        return None
+    entry["used"] = time.time()
+    _save(path, entries, max_bytes)
+    return [tuple(r) for r in entry["rows"]]
+
+def cache_put(path, key, fp, rows, max_bytes=DEFAULT_MAX_BYTES):
+    entries = _load(path)
+    entries[key] = {"fp": fp, "rows": [list(r) for r in rows], "used": time.time()}
+    _save(path, entries, max_bytes)
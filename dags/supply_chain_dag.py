@@ -1,12 +1,10 @@
 from airflow import DAG
 from airflow.operators.python import PythonOperator
 from datetime import datetime, timedelta
-# On importe tout depuis notre nouveau fichier utils.py
-from utils import (
-    seed_database, generate_and_process, upload_raw_to_hdfs, 
-    setup_tables, run_trino_aggregation, generate_supplier_files, 
-    upload_results_to_hdfs
-)
+# Les fonctions métier vivent dans utils.py. Elles sont importées à l'intérieur
+# des callables : le scheduler re-parse ce fichier en boucle, et ce parsing ne
+# doit charger ni utils ni ses dépendances (psycopg2, faker, trino).
+# Le budget de parsing est vérifié par scripts/bench_dag_parse.py.
 
 default_args = {
     'owner': 'Khalil',
@@ -21,26 +19,54 @@ with DAG(
     schedule_interval='0 22 * * *',
     start_date=datetime(2026, 1, 1),
     catchup=False,
+    # Un seul run à la fois : un recalcul ciblé ne lit pas les tables qu'un autre run est en train de compacter
+    max_active_runs=1,
 ) as dag:
 
+    # Recalcul ciblé : déclencher le DAG avec la conf {"skus": ["PRD-001", ...]}.
+    # Seul compute_and_export travaille, sur les données déjà ingérées pour la date ;
+    # les autres tâches ne font rien.
+    def scoped_skus(kwargs):
+        from utils import sku_scope
+        dag_run = kwargs.get('dag_run')
+        return sku_scope(dag_run.conf if dag_run else None)
+
+    def skip_if_scoped(kwargs):
+        if scoped_skus(kwargs):
+            print("SKU-scoped run: step skipped, the inputs already ingested for this date are reused.")
+            return True
+        return False
+
     # 1. Initialisation 
+    def task_seed(**kwargs):
+        if skip_if_scoped(kwargs): return
+        from utils import seed_database
+        seed_database()
+
     t_seed = PythonOperator(
         task_id='seed_postgres_db',
-        python_callable=seed_database
+        python_callable=task_seed,
+        provide_context=True
     )
 
     # 2. Génération des données (Simulation)
     def task_gen(**kwargs):
+        if skip_if_scoped(kwargs): return
+        from utils import generate_and_process
         generate_and_process(kwargs['ds']) # 'ds' = date d'exécution (YYYY-MM-DD)
 
+    # Reprise automatique : un retry repart du dernier chunk terminé (generation_checkpoint.py)
     t_gen = PythonOperator(
         task_id='generate_data',
         python_callable=task_gen,
-        provide_context=True
+        provide_context=True,
+        retries=3
     )
 
     # 3. Ingestion HDFS (Raw)
     def task_up_raw(**kwargs):
+        if skip_if_scoped(kwargs): return
+        from utils import upload_raw_to_hdfs
         upload_raw_to_hdfs(kwargs['ds'])
 
     t_up_raw = PythonOperator(
@@ -50,18 +76,36 @@ with DAG(
     )
 
     # 4. Setup Tables (Hive Metastore)
+    def task_setup(**kwargs):
+        if skip_if_scoped(kwargs): return
+        from utils import setup_tables
+        setup_tables(kwargs['ds'])
+
     t_setup = PythonOperator(
         task_id='setup_hive_tables',
-        python_callable=setup_tables
+        python_callable=task_setup,
+        provide_context=True
+    )
+
+    # 5. Compaction vers les tables bucketées par SKU (no-op si BUCKETED_LAYOUT est désactivé)
+    def task_compact(**kwargs):
+        if skip_if_scoped(kwargs): return
+        from utils import compact_bucketed
+        compact_bucketed(kwargs['ds'])
+
+    t_compact = PythonOperator(
+        task_id='compact_bucketed_tables',
+        python_callable=task_compact,
+        provide_context=True
     )
 
-    # 5. Compute (Trino) + 6. Generation Commandes
+    # 6. Compute (Trino) + 7. Generation Commandes
     def task_compute_and_export(**kwargs):
+        from utils import compute_supplier_files, upload_results_to_hdfs
         date_str = kwargs['ds']
-        # Appel Trino
-        results = run_trino_aggregation(date_str)
-        # Génération fichiers JSON
-        output_path = generate_supplier_files(results, date_str)
+        skus = scoped_skus(kwargs)
+        # Appel Trino + génération fichiers JSON (NET_DEMAND_MODE : python ou federated)
+        output_path = compute_supplier_files(date_str, skus)
         # Upload final
         upload_results_to_hdfs(output_path, date_str)
 
@@ -71,5 +115,5 @@ with DAG(
         provide_context=True
     )
 
-    # Orchestration
-    t_seed >> t_gen >> t_up_raw >> t_setup >> t_process
\ No newline at end of file
+    # Orchestration : la compaction précède le calcul, qui peut lire les tables bucketées
+    t_seed >> t_gen >> t_up_raw >> t_setup >> t_compact >> t_process
\ No newline at end of file
@@ -2,12 +2,13 @@ import os
 import json
 import csv
 import random
-import subprocess
 import shutil
-import psycopg2
+import re
 from datetime import datetime
-from faker import Faker
-from trino.dbapi import connect
+
+# NB : psycopg2, faker et trino sont importés à l'intérieur des fonctions.
+# Ce module est chargé par le DAG à chaque boucle de parsing du scheduler :
+# les dépendances lourdes ne doivent être payées qu'à l'exécution des tâches.
 
 # --- 1. CONFIGURATION CENTRALISÉE ---
 
@@ -29,75 +30,189 @@ TRINO_PORT = 8080
 TRINO_USER = "admin"
 
 # Chemins : On utilise des chemins absolus pour Airflow
-AIRFLOW_DATA_DIR = "/opt/airflow/generated_data"
-
-fake = Faker()
-
-# --- 2. DONNÉES DE RÉFÉRENCE (CONSTANTES) ---
-SUPPLIERS = [
-    ("SUP-001", "Les Eaux Minérales d'Oulmès", "Casablanca"),
-    ("SUP-002", "Centrale Danone", "Casablanca"),
-    ("SUP-003", "Dari Couspate", "Salé"),
-    ("SUP-004", "Cosumar", "Casablanca"),
-    ("SUP-005", "Dislog Group", "Casablanca")
-]
-
-MOROCCAN_PRODUCTS = [
-    ("PRD-001", "Sidi Ali 1.5L", 6.50, "SUP-001", 100, 50),
-    ("PRD-002", "Oulmes 1L", 7.00, "SUP-001", 80, 40),
-    ("PRD-003", "Couscous Dari 1kg", 13.50, "SUP-003", 50, 20),
-    ("PRD-004", "Thé Sultan Vert", 18.00, "SUP-004", 60, 20),
-    ("PRD-005", "Aicha Confiture Fraise", 22.00, "SUP-005", 30, 10),
-    ("PRD-006", "Lait Centrale Danone", 3.50, "SUP-002", 200, 100),
-    ("PRD-007", "Raibi Jamila", 2.50, "SUP-002", 250, 100),
-    ("PRD-008", "Huile d'Olive Al Horra", 65.00, "SUP-005", 20, 10),
-    ("PRD-009", "Fromage La Vache Qui Rit", 15.00, "SUP-005", 40, 20),
-    ("PRD-010", "Merendina", 2.00, "SUP-005", 300, 50),
-    ("PRD-011", "Pasta Tria", 8.00, "SUP-003", 60, 20),
-    ("PRD-012", "Sardines Titus", 5.50, "SUP-005", 80, 20),
-    ("PRD-013", "Coca-Cola 1L", 9.00, "SUP-005", 150, 30),
-    ("PRD-014", "Atay Sebou", 14.00, "SUP-004", 50, 10),
-    ("PRD-015", "Eau Ciel 5L", 12.00, "SUP-005", 40, 10)
-]
-
-STORES = [
-    ("STORE-CAS-01", "Marjane Californie"), 
-    ("STORE-CAS-02", "Morocco Mall"), 
-    ("STORE-RAB-01", "Marjane Hay Riad"), 
-    ("STORE-TNG-01", "Socco Alto"), 
-    ("STORE-MAR-01", "Menara Mall"), 
-    ("STORE-AGA-01", "Carrefour Agadir"), 
-    ("STORE-FES-01", "Borj Fez")
-]
+AIRFLOW_DATA_DIR = os.environ.get("PROCUREMENT_DATA_DIR", "/opt/airflow/generated_data")
+
+# Backends : "docker" = Postgres + HDFS (docker exec) + Trino,
+# "local" = SQLite + dossier local + agrégation Python (runs sans Docker, profiling)
+PIPELINE_BACKEND = os.environ.get("PIPELINE_BACKEND", "docker")
+LOCAL_HDFS_ROOT = os.environ.get("LOCAL_HDFS_ROOT", f"{AIRFLOW_DATA_DIR}/local_hdfs")
+SQLITE_DB_PATH = os.environ.get("SQLITE_DB_PATH", f"{AIRFLOW_DATA_DIR}/local_db/procurement.db")
+
+ORDERS_PER_DAY = int(os.environ.get("ORDERS_PER_DAY", 5000))
+
+# Écriture des partitions de commandes : fichiers ouverts simultanément et plafond mémoire des buffers
+PARTITION_MAX_OPEN_FILES = int(os.environ.get("PARTITION_MAX_OPEN_FILES", 256))
+PARTITION_BLOCK_BYTES = int(os.environ.get("PARTITION_BLOCK_BYTES", 1024 * 1024))
+PARTITION_MEMORY_LIMIT = int(os.environ.get("PARTITION_MEMORY_LIMIT", 64 * 1024 * 1024))
+
+# Génération reprenable : taille d'un chunk (coût maximal d'un retry) et graine du RNG
+GENERATION_CHUNK_ORDERS = int(os.environ.get("GENERATION_CHUNK_ORDERS", 100000))
+GENERATION_SEED = os.environ.get("GENERATION_SEED", "0")
+
+# Cache des résultats Trino (évite de relancer la requête si les partitions n'ont pas bougé)
+RESULT_CACHE_ENABLED = os.environ.get("PROCUREMENT_RESULT_CACHE", "1") == "1"
+RESULT_CACHE_FILE = f"{AIRFLOW_DATA_DIR}/cache/trino_aggregation.json"
+RESULT_CACHE_MAX_BYTES = int(os.environ.get("PROCUREMENT_RESULT_CACHE_MAX_BYTES", 2 * 1024 * 1024))
+
+# Inventaire : "full" = dump complet quotidien (raw_inventory),
+# "delta" = seules les positions modifiées + checkpoint complet périodique (raw_inventory_delta)
+INVENTORY_SNAPSHOT_MODE = os.environ.get("INVENTORY_SNAPSHOT_MODE", "full")
+INVENTORY_CHECKPOINT_EVERY = int(os.environ.get("INVENTORY_CHECKPOINT_EVERY", 7))
+# Part des positions (entrepôt x SKU) re-tirées chaque jour, les autres sont reprises de la veille
+INVENTORY_DAILY_CHANGE_RATE = float(os.environ.get("INVENTORY_DAILY_CHANGE_RATE", 0.1))
+INVENTORY_STATE_DIR = f"{AIRFLOW_DATA_DIR}/inventory_state"
+
+# Besoin net : "python" = totaux Trino puis jointure avec les règles Postgres dans le worker,
+# "federated" = une seule requête Trino qui joint HDFS et le catalogue postgres
+NET_DEMAND_MODE = os.environ.get("NET_DEMAND_MODE", "python")
+
+# Profiling Trino : query_id + stats de chaque requête dans metrics/dt=<date>/run=<run_id>/trino_queries.jsonl,
+# et en option la sortie EXPLAIN ANALYZE des requêtes de calcul (ré-exécute la requête : coût x2).
+# run_id = celui du DAG run Airflow, sinon PIPELINE_RUN_ID, sinon un identifiant propre au processus.
+TRINO_QUERY_STATS = os.environ.get("TRINO_QUERY_STATS", "1") == "1"
+TRINO_EXPLAIN_ANALYZE = os.environ.get("TRINO_EXPLAIN_ANALYZE", "0") == "1"
+METRICS_DIR = f"{AIRFLOW_DATA_DIR}/metrics"
+
+# Tables bucketées par sku (et triées) alimentées par la compaction : lookups et recalculs par SKU
+BUCKETED_LAYOUT = os.environ.get("BUCKETED_LAYOUT", "0") == "1"
+SKU_BUCKET_COUNT = int(os.environ.get("SKU_BUCKET_COUNT", 32))
+
+_fake = None
+
+def get_faker():
+    """Instance Faker partagée, créée à la première utilisation"""
+    global _fake
+    if _fake is None:
+        from faker import Faker
+        _fake = Faker()
+    return _fake
+
+# --- 2. DONNÉES DE RÉFÉRENCE ---
+# Le catalogue (démo ou généré pour les tests de charge) vit dans catalog.py,
+# partagé avec scripts/generate_orders.py. Voir CATALOG_SUPPLIERS / CATALOG_SKUS / CATALOG_STORES.
 
 # --- 3. FONCTIONS UTILITAIRES ---
 
 def get_db_connection():
+    if PIPELINE_BACKEND == "local":
+        from backends import SQLiteConnection
+        return SQLiteConnection(SQLITE_DB_PATH)
+    import psycopg2
     return psycopg2.connect(**DB_PARAMS)
 
+def trino_execute(cur, query, label, date_str, explain=False):
+    """Exécute une requête Trino, renvoie ses lignes et enregistre son query_id et ses statistiques"""
+    cur.execute(query)
+    rows = cur.fetchall()
+    if TRINO_QUERY_STATS:
+        record_trino_stats(cur, label, date_str)
+    if explain and TRINO_EXPLAIN_ANALYZE:
+        cur.execute(f"EXPLAIN ANALYZE {query}")
+        plan = "\n".join(r[0] for r in cur.fetchall())
+        run_dir = trino_metrics_dir(date_str)
+        os.makedirs(run_dir, exist_ok=True)
+        with open(f"{run_dir}/explain_{label}.txt", "w") as f:
+            f.write(plan)
+    return rows
+
+_local_run_id = None
+
+def current_run_id():
+    """(run_id, numéro d'essai) du run en cours. Airflow expose le contexte de la tâche dans
+    l'environnement (AIRFLOW_CTX_*) ; hors Airflow, un identifiant est créé une fois par processus."""
+    global _local_run_id
+    run_id = os.environ.get("AIRFLOW_CTX_DAG_RUN_ID") or os.environ.get("PIPELINE_RUN_ID")
+    if run_id is None:
+        if _local_run_id is None:
+            _local_run_id = f"local__{datetime.now().strftime('%Y%m%dT%H%M%S')}_{os.getpid()}"
+        run_id = _local_run_id
+    try_number = os.environ.get("AIRFLOW_CTX_TRY_NUMBER")
+    return run_id, int(try_number) if try_number else None
+
+def trino_metrics_dir(date_str):
+    """Dossier des stats Trino d'un run : les re-runs et backfills d'une même date ne se mélangent pas"""
+    run_id = re.sub(r"[^\w.-]", "_", current_run_id()[0])
+    return f"{METRICS_DIR}/dt={date_str}/run={run_id}"
+
+def record_trino_stats(cur, label, date_str):
+    """Ajoute les stats de la dernière requête à metrics/dt=<date>/run=<run_id>/trino_queries.jsonl
+    (les essais d'un même run sont distingués par try_number).
+    Les requêtes de calcul sont aussi résumées dans metrics/trino_history.jsonl pour suivre
+    la croissance du coût de scan d'un run à l'autre."""
+    stats = cur.stats or {}
+    run_id, try_number = current_run_id()
+    record = {
+        "recorded_at": datetime.now().isoformat(timespec="seconds"),
+        "run_id": run_id,
+        "try_number": try_number,
+        "date": date_str,
+        "label": label,
+        "query_id": cur.query_id,
+        "state": stats.get("state"),
+        "queued_ms": stats.get("queuedTimeMillis"),
+        "elapsed_ms": stats.get("elapsedTimeMillis"),
+        "cpu_ms": stats.get("cpuTimeMillis"),
+        "wall_ms": stats.get("wallTimeMillis"),
+        "processed_rows": stats.get("processedRows"),
+        "processed_bytes": stats.get("processedBytes"),
+        "physical_input_bytes": stats.get("physicalInputBytes"),
+        "peak_memory_bytes": stats.get("peakMemoryBytes"),
+        "spilled_bytes": stats.get("spilledBytes"),
+        "total_splits": stats.get("totalSplits"),
+        "completed_splits": stats.get("completedSplits"),
+        "nodes": stats.get("nodes"),
+    }
+    run_dir = trino_metrics_dir(date_str)
+    os.makedirs(run_dir, exist_ok=True)
+    with open(f"{run_dir}/trino_queries.jsonl", "a") as f:
+        f.write(json.dumps(dict(record, stats=stats), default=str) + "\n")
+    if label.startswith(("sync_", "setup_")):
+        return
+
+    # Un scan bien plus gros que d'habitude signale en général une partition non élaguée
+    history_file = f"{METRICS_DIR}/trino_history.jsonl"
+    previous = []
+    if os.path.exists(history_file):
+        with open(history_file) as f:
+            previous = [r["physical_input_bytes"] for r in map(json.loads, f)
+                        if r["label"] == label and r.get("physical_input_bytes")][-7:]
+    scanned = record["physical_input_bytes"]
+    if previous and scanned and scanned > 3 * sorted(previous)[len(previous) // 2]:
+        print(f"WARNING: {label} read {scanned} bytes (> 3x recent median). "
+              f"Check partition pruning for query {cur.query_id}.")
+    with open(history_file, "a") as f:
+        f.write(json.dumps(record, default=str) + "\n")
+
+def get_storage():
+    """Stockage brut : HDFS (via docker) ou dossier local selon PIPELINE_BACKEND"""
+    from backends import DockerHdfs, LocalHdfs
+    if PIPELINE_BACKEND == "local":
+        return LocalHdfs(LOCAL_HDFS_ROOT)
+    return DockerHdfs()
+
+def get_trino_connection():
+    from trino.dbapi import connect
+    return connect(host=TRINO_HOST, port=TRINO_PORT, user=TRINO_USER, catalog="hive", schema="default")
+
 def seed_database():
     """Initialise la BDD Postgres (Reset)"""
+    from catalog import get_catalog, catalog_tables, bulk_insert
+    suppliers, products, stores = get_catalog()
     conn = get_db_connection()
-    print("Seeding Database...")
+    print(f"Seeding Database ({len(suppliers)} suppliers, {len(products)} SKUs, {len(stores)} stores)...")
     with conn.cursor() as cur:
         for t in ["replenishment_rules", "products", "suppliers", "warehouses", "stores"]: 
             cur.execute(f"DROP TABLE IF EXISTS {t} CASCADE")
         
         cur.execute("CREATE TABLE suppliers (supplier_id VARCHAR(50) PRIMARY KEY, name VARCHAR(100), city VARCHAR(50))")
-        for s in SUPPLIERS: cur.execute("INSERT INTO suppliers VALUES (%s, %s, %s)", s)
-        
         cur.execute("CREATE TABLE products (sku VARCHAR(50) PRIMARY KEY, name VARCHAR(100), price DECIMAL(10,2), supplier_id VARCHAR(50))")
-        for p in MOROCCAN_PRODUCTS: cur.execute("INSERT INTO products VALUES (%s, %s, %s, %s)", (p[0], p[1], p[2], p[3]))
-        
         cur.execute("CREATE TABLE replenishment_rules (sku VARCHAR(50) PRIMARY KEY, safety_stock INT, moq INT)")
-        for p in MOROCCAN_PRODUCTS: cur.execute("INSERT INTO replenishment_rules VALUES (%s, %s, %s)", (p[0], p[4], p[5]))
-        
         cur.execute("CREATE TABLE warehouses (warehouse_id VARCHAR(50) PRIMARY KEY, store_id VARCHAR(50))")
         cur.execute("CREATE TABLE stores (store_id VARCHAR(50) PRIMARY KEY, name VARCHAR(100))")
         
-        for s in STORES: 
-            cur.execute("INSERT INTO warehouses VALUES (%s, %s)", (f"WH-{s[0]}", s[0]))
-            cur.execute("INSERT INTO stores VALUES (%s, %s)", (s[0], s[1]))
+        # Chargement en masse : un COPY par table au lieu d'un INSERT par ligne
+        for table, rows in catalog_tables(suppliers, products, stores).items():
+            bulk_insert(cur, table, rows)
             
         conn.commit()
     conn.close()
@@ -143,81 +258,202 @@ def generate_and_process(date_str):
         os.makedirs(AIRFLOW_DATA_DIR)
         
     # --- Generation Logic ---
+    # Génération découpée en chunks avec checkpoint : un retry reprend après le dernier chunk terminé
+    from partition_writer import PartitionWriter
+    from generation_checkpoint import GenerationCheckpoint
     base_path_orders = f"{AIRFLOW_DATA_DIR}/orders/dt={date_str}"
-    files = {}
-    sales_counts = {sku: 0 for sku in products}
-    
-    for sid in stores:
-        p = f"{base_path_orders}/store_id={sid}"
-        os.makedirs(p, exist_ok=True)
-        files[sid] = open(f"{p}/orders.json", "w", encoding="utf-8")
-
     skus = list(products.keys())
-    # Generation simple pour la démo
-    for i in range(5000): # ORDERS_PER_DAY
-        store = random.choice(stores)
-        items = []
-        for _ in range(random.randint(1, 3)):
-            sku = random.choice(skus)
-            qty = random.randint(1, 5)
-            sales_counts[sku] += qty
-            items.append({"sku": sku, "quantity": qty, "unit_price": products[sku]['price']})
-        
-        order = {"order_id": fake.uuid4(), "timestamp": f"{date_str}T{fake.time()}", "items": items}
-        files[store].write(json.dumps(order) + '\n')
-    
-    for f in files.values(): f.close()
+    n_chunks = max(1, -(-ORDERS_PER_DAY // GENERATION_CHUNK_ORDERS))
+    checkpoint = GenerationCheckpoint(
+        f"{AIRFLOW_DATA_DIR}/checkpoints/generation/dt={date_str}",
+        {"orders": ORDERS_PER_DAY, "chunk": GENERATION_CHUNK_ORDERS, "seed": GENERATION_SEED,
+         "stores": stores, "skus": skus, "prices": [products[sku]['price'] for sku in skus]}
+    )
+    state = checkpoint.load()
+    rng = random.Random(f"{date_str}:{GENERATION_SEED}")
+    if state is None:
+        # Départ à zéro : on efface les fichiers d'un run précédent (autre configuration)
+        checkpoint.reset()
+        if os.path.exists(base_path_orders): shutil.rmtree(base_path_orders)
+        first_chunk = 0
+        sales_counts = {sku: 0 for sku in products}
+        offsets = None
+    else:
+        first_chunk = state["chunk"] + 1
+        rng.setstate(state["rng"])
+        sales_counts = state["sales_counts"]
+        offsets = state["offsets"]
+        if state["complete"]:
+            print(f"Orders for {date_str} already generated (checkpoint verified on disk).")
+        else:
+            print(f"Resuming generation for {date_str} at chunk {first_chunk}/{n_chunks}.")
+
+    # Un fichier par partition pour toute la journée : chaque chunk y ajoute ses lignes,
+    # un retry tronque chaque fichier à l'offset du dernier chunk terminé
+    fake = get_faker()
+    writer = PartitionWriter(
+        base_path_orders, "orders.json", partitions=[f"store_id={sid}" for sid in stores],
+        max_open_files=PARTITION_MAX_OPEN_FILES, block_size=PARTITION_BLOCK_BYTES, memory_limit=PARTITION_MEMORY_LIMIT,
+        offsets=offsets
+    )
+    for chunk in range(first_chunk, n_chunks):
+        fake.seed_instance(rng.getrandbits(64))
+        for i in range(chunk * GENERATION_CHUNK_ORDERS, min(ORDERS_PER_DAY, (chunk + 1) * GENERATION_CHUNK_ORDERS)):
+            store = rng.choice(stores)
+            items = []
+            for _ in range(rng.randint(1, 3)):
+                sku = rng.choice(skus)
+                qty = rng.randint(1, 5)
+                sales_counts[sku] += qty
+                items.append({"sku": sku, "quantity": qty, "unit_price": products[sku]['price']})
+            
+            # Heure tirée du RNG : fake.time() dépend de l'horloge, une reprise ne serait plus identique
+            secs = rng.randrange(86400)
+            order = {"order_id": fake.uuid4(), "timestamp": f"{date_str}T{secs // 3600:02d}:{secs // 60 % 60:02d}:{secs % 60:02d}", "items": items}
+            writer.write(f"store_id={store}", json.dumps(order) + '\n')
+        offsets = writer.checkpoint()
+        checkpoint.save(chunk, {"rng": rng.getstate(), "sales_counts": sales_counts, "offsets": offsets},
+                        files={writer.path(k): size for k, size in offsets.items()}, complete=chunk == n_chunks - 1)
+    writer.close()
 
     # --- Inventory Logic ---
-    base_path_inv = f"{AIRFLOW_DATA_DIR}/inventory/dt={date_str}"
-    os.makedirs(base_path_inv, exist_ok=True)
-    
-    with open(f"{base_path_inv}/inventory.csv", 'w', newline='') as f:
-        writer = csv.writer(f)
-        writer.writerow(["warehouse_id", "sku", "available_qty", "reserved_qty"])
+    # Le stock évolue d'un jour à l'autre : seule une partie des positions de la veille est re-tirée
+    base = load_inventory_base(date_str)
+    previous = base[1]
+    def inventory_rows():
         for store in stores:
             wh_id = f"WH-{store}"
             for sku in skus:
+                old = previous.get((wh_id, sku))
+                if old is not None and rng.random() >= INVENTORY_DAILY_CHANGE_RATE:
+                    yield wh_id, sku, old[0], old[1]
+                    continue
                 store_sales_share = sales_counts[sku] // len(stores)
-                start_stock = max(0, store_sales_share + random.randint(-5, 50))
-                writer.writerow([wh_id, sku, start_stock, 0])
+                start_stock = max(0, store_sales_share + rng.randint(-5, 50))
+                yield wh_id, sku, start_stock, 0
+
+    if INVENTORY_SNAPSHOT_MODE == "delta":
+        write_inventory_delta(date_str, inventory_rows(), base)
+    else:
+        base_path_inv = f"{AIRFLOW_DATA_DIR}/inventory/dt={date_str}"
+        os.makedirs(base_path_inv, exist_ok=True)
+        os.makedirs(INVENTORY_STATE_DIR, exist_ok=True)
+        
+        with open(f"{base_path_inv}/inventory.csv", 'w', newline='') as f, open(INVENTORY_STATE_TMP, 'w', newline='') as s:
+            writer, state_writer = csv.writer(f), csv.writer(s)
+            writer.writerow(["warehouse_id", "sku", "available_qty", "reserved_qty"])
+            for row in inventory_rows():
+                writer.writerow(row)
+                state_writer.writerow(row)
+        save_inventory_state(date_str, base, {"dt": date_str, "checkpoint_dt": date_str, "mode": "full"})
 
     print(f"Generated data for {date_str} in {AIRFLOW_DATA_DIR}")
 
+def load_inventory_state(name="positions"):
+    """Snapshot d'inventaire sauvegardé : (meta, {(warehouse_id, sku): (available, reserved)}).
+    'positions' = dernier snapshot, 'positions.prev' = celui d'avant (base d'un re-run de la même date)."""
+    meta_file = f"{INVENTORY_STATE_DIR}/{name}.json"
+    if not os.path.exists(meta_file):
+        return None, {}
+    with open(meta_file) as f:
+        meta = json.load(f)
+    positions = {}
+    with open(f"{INVENTORY_STATE_DIR}/{name}.csv", newline='') as f:
+        for wh_id, sku, avail, reserved in csv.reader(f):
+            positions[(wh_id, sku)] = (int(avail), int(reserved))
+    return meta, positions
+
+def load_inventory_base(date_str):
+    """Snapshot de référence pour date_str : (meta, positions, rerun).
+    Un retry de la dernière date repart du snapshot précédent : sa sortie est identique au premier essai."""
+    meta, positions = load_inventory_state()
+    rerun = meta is not None and meta["dt"] == date_str
+    if rerun:
+        meta, positions = load_inventory_state("positions.prev")
+    return meta, positions, rerun
+
+INVENTORY_STATE_TMP = f"{INVENTORY_STATE_DIR}/positions.csv.tmp"
+
+def save_inventory_state(date_str, base, meta):
+    """Remplace le snapshot sauvegardé par INVENTORY_STATE_TMP (l'ancien devient positions.prev)"""
+    rerun = base[2]
+    if not rerun and os.path.exists(f"{INVENTORY_STATE_DIR}/positions.json"):
+        os.replace(f"{INVENTORY_STATE_DIR}/positions.csv", f"{INVENTORY_STATE_DIR}/positions.prev.csv")
+        os.replace(f"{INVENTORY_STATE_DIR}/positions.json", f"{INVENTORY_STATE_DIR}/positions.prev.json")
+    os.replace(INVENTORY_STATE_TMP, f"{INVENTORY_STATE_DIR}/positions.csv")
+    with open(f"{INVENTORY_STATE_DIR}/positions.json", "w") as f:
+        json.dump(meta, f)
+
+def write_inventory_delta(date_str, rows, base):
+    """Écrit uniquement les positions qui ont changé depuis le snapshot précédent.
+    Un checkpoint complet est écrit au premier run (ou après des runs en mode full), tous les
+    INVENTORY_CHECKPOINT_EVERY jours, lors du re-run d'une date antérieure au dernier snapshot
+    (le delta n'aurait plus de base valide) et quand des positions ont disparu : un delta ne sait
+    qu'ajouter ou modifier des lignes, la position supprimée garderait sa valeur du checkpoint.
+    NB : re-générer une date passée impose de re-générer aussi les dates suivantes."""
+    meta, previous, _ = base
+    full = (
+        meta is None
+        or meta.get("mode", "delta") != "delta"
+        or date_str <= meta["dt"]
+        or (datetime.strptime(date_str, "%Y-%m-%d") - datetime.strptime(meta["checkpoint_dt"], "%Y-%m-%d")).days >= INVENTORY_CHECKPOINT_EVERY
+    )
+    kind = "full" if full else "delta"
+
+    base_path = f"{AIRFLOW_DATA_DIR}/inventory_delta/dt={date_str}"
+    if os.path.exists(base_path): shutil.rmtree(base_path)
+    os.makedirs(f"{base_path}/kind={kind}")
+    os.makedirs(INVENTORY_STATE_DIR, exist_ok=True)
+
+    written = total = kept = 0
+    with open(f"{base_path}/kind={kind}/inventory.csv", 'w', newline='') as f, open(INVENTORY_STATE_TMP, 'w', newline='') as s:
+        writer, state_writer = csv.writer(f), csv.writer(s)
+        writer.writerow(["warehouse_id", "sku", "available_qty", "reserved_qty"])
+        for wh_id, sku, avail, reserved in rows:
+            total += 1
+            state_writer.writerow([wh_id, sku, avail, reserved])
+            old = previous.get((wh_id, sku))
+            if old is not None:
+                kept += 1
+            if full or old != (avail, reserved):
+                writer.writerow([wh_id, sku, avail, reserved])
+                written += 1
+
+    if not full and kept < len(previous):
+        print(f"Inventory: {len(previous) - kept} positions removed since {meta['dt']}, writing a full checkpoint.")
+        full, kind = True, "full"
+        shutil.rmtree(base_path)
+        os.makedirs(f"{base_path}/kind={kind}")
+        with open(f"{base_path}/kind={kind}/inventory.csv", 'w', newline='') as f, open(INVENTORY_STATE_TMP, newline='') as s:
+            csv.writer(f).writerow(["warehouse_id", "sku", "available_qty", "reserved_qty"])
+            shutil.copyfileobj(s, f)
+        written = total
+
+    save_inventory_state(date_str, base, {"dt": date_str, "checkpoint_dt": date_str if full else meta["checkpoint_dt"], "mode": "delta"})
+    print(f"Inventory snapshot ({kind}): {written}/{total} rows written.")
+
 def upload_raw_to_hdfs(date_str):
     """Upload les commandes et l'inventaire (Ingestion)"""
+    storage = get_storage()
     # 1. Orders
-    local_orders = f"{AIRFLOW_DATA_DIR}/orders/dt={date_str}"
-    target_orders = f"/raw/orders/dt={date_str}"
-    
-    # Clean & Upload
-    subprocess.run(f"docker exec namenode hdfs dfs -rm -r -f {target_orders}", shell=True)
-    subprocess.run(f"docker exec namenode hdfs dfs -mkdir -p /raw/orders", shell=True)
-    
-    # Astuce: On copie via un tmp dans le conteneur
-    tmp_path = f"/tmp/orders_{date_str}"
-    subprocess.run(f"docker exec namenode rm -rf {tmp_path}", shell=True)
-    subprocess.run(f"docker cp \"{local_orders}\" namenode:\"{tmp_path}\"", shell=True)
-    subprocess.run(f"docker exec namenode hdfs dfs -put \"{tmp_path}\" /raw/orders/dt={date_str}", shell=True)
+    storage.put_dir(f"{AIRFLOW_DATA_DIR}/orders/dt={date_str}", f"/raw/orders/dt={date_str}")
     
-    # 2. Inventory
-    local_inv = f"{AIRFLOW_DATA_DIR}/inventory/dt={date_str}"
-    tmp_inv = f"/tmp/inv_{date_str}"
-    
-    subprocess.run(f"docker exec namenode hdfs dfs -mkdir -p /raw/inventory", shell=True)
-    subprocess.run(f"docker exec namenode rm -rf {tmp_inv}", shell=True)
-    subprocess.run(f"docker cp \"{local_inv}\" namenode:\"{tmp_inv}\"", shell=True)
-    subprocess.run(f"docker exec namenode hdfs dfs -put -f \"{tmp_inv}\" /raw/inventory/dt={date_str}", shell=True)
+    # 2. Inventory (un re-run peut passer de 'delta' à 'full' : la date est remplacée entièrement)
+    inv_dir = "inventory_delta" if INVENTORY_SNAPSHOT_MODE == "delta" else "inventory"
+    storage.put_dir(f"{AIRFLOW_DATA_DIR}/{inv_dir}/dt={date_str}", f"/raw/{inv_dir}/dt={date_str}")
     
     print("Upload Raw Data Complete.")
 
-def setup_tables():
-    """Crée les tables externes dans Trino/Hive"""
-    conn = connect(host=TRINO_HOST, port=TRINO_PORT, user=TRINO_USER, catalog="hive", schema="default")
+def setup_tables(date_str):
+    """Crée les tables externes dans Trino/Hive (stats des requêtes rattachées au run de date_str)"""
+    if PIPELINE_BACKEND == "local":
+        print("Local backend: no Hive tables to create.")
+        return
+    conn = get_trino_connection()
     cur = conn.cursor()
     
-    cur.execute("CREATE SCHEMA IF NOT EXISTS hive.default")
-    cur.execute("DROP TABLE IF EXISTS hive.default.raw_orders")
+    trino_execute(cur, "CREATE SCHEMA IF NOT EXISTS hive.default", "setup_schema_default", date_str)
+    trino_execute(cur, "DROP TABLE IF EXISTS hive.default.raw_orders", "setup_drop_raw_orders", date_str)
     
     create_orders = """
     CREATE TABLE hive.default.raw_orders (
@@ -229,9 +465,9 @@ def setup_tables():
         partitioned_by = ARRAY['dt', 'store_id']
     )
     """
-    cur.execute(create_orders)
+    trino_execute(cur, create_orders, "setup_create_raw_orders", date_str)
     
-    cur.execute("DROP TABLE IF EXISTS hive.default.raw_inventory")
+    trino_execute(cur, "DROP TABLE IF EXISTS hive.default.raw_inventory", "setup_drop_raw_inventory", date_str)
     create_inv = """
     CREATE TABLE hive.default.raw_inventory (
         warehouse_id VARCHAR, sku VARCHAR, available_qty VARCHAR, reserved_qty VARCHAR, dt VARCHAR
@@ -241,17 +477,212 @@ def setup_tables():
         partitioned_by = ARRAY['dt']
     )
     """
-    cur.execute(create_inv)
+    trino_execute(cur, create_inv, "setup_create_raw_inventory", date_str)
+
+    # Inventaire en delta : colonnes typées (TEXTFILE, le format CSV de Hive n'accepte que VARCHAR)
+    trino_execute(cur, "DROP TABLE IF EXISTS hive.default.raw_inventory_delta", "setup_drop_raw_inventory_delta", date_str)
+    create_inv_delta = """
+    CREATE TABLE hive.default.raw_inventory_delta (
+        warehouse_id VARCHAR, sku VARCHAR, available_qty INTEGER, reserved_qty INTEGER, dt VARCHAR, kind VARCHAR
+    ) WITH (
+        format = 'TEXTFILE', textfile_field_separator = ',', skip_header_line_count = 1,
+        external_location = 'hdfs://namenode:9000/raw/inventory_delta/',
+        partitioned_by = ARRAY['dt', 'kind']
+    )
+    """
+    trino_execute(cur, create_inv_delta, "setup_create_raw_inventory_delta", date_str)
+
+    # Positions reconstruites pour chaque date : dernière valeur connue depuis le checkpoint précédent
+    create_positions = """
+    CREATE OR REPLACE VIEW hive.default.inventory_positions AS
+    WITH days AS (SELECT DISTINCT dt FROM hive.default.raw_inventory_delta),
+    checkpoints AS (
+        SELECT d.dt AS as_of, MAX(c.dt) AS checkpoint_dt
+        FROM days d
+        JOIN (SELECT DISTINCT dt FROM hive.default.raw_inventory_delta WHERE kind = 'full') c ON c.dt <= d.dt
+        GROUP BY d.dt
+    )
+    SELECT as_of AS dt, warehouse_id, sku, available_qty, reserved_qty
+    FROM (
+        SELECT k.as_of, r.warehouse_id, r.sku, r.available_qty, r.reserved_qty,
+               ROW_NUMBER() OVER (PARTITION BY k.as_of, r.warehouse_id, r.sku ORDER BY r.dt DESC) AS rn
+        FROM checkpoints k
+        JOIN hive.default.raw_inventory_delta r ON r.dt BETWEEN k.checkpoint_dt AND k.as_of
+    )
+    WHERE rn = 1
+    """
+    trino_execute(cur, create_positions, "setup_view_inventory_positions", date_str)
+
+    if BUCKETED_LAYOUT:
+        # Tables alimentées par compact_bucketed : pas de DROP, elles portent l'historique compacté.
+        # Tables managées (pas d'external_location) : un DELETE de partition supprime aussi ses fichiers,
+        # ce qui rend la compaction ré-exécutable. Le schéma fixe leur emplacement sur HDFS.
+        trino_execute(cur, "CREATE SCHEMA IF NOT EXISTS hive.curated WITH (location = 'hdfs://namenode:9000/warehouse/curated')",
+                      "setup_schema_curated", date_str)
+        trino_execute(cur, f"""
+        CREATE TABLE IF NOT EXISTS hive.curated.order_lines_bucketed (
+            order_id VARCHAR, timestamp VARCHAR, sku VARCHAR, quantity INTEGER, unit_price DOUBLE,
+            store_id VARCHAR, dt VARCHAR
+        ) WITH (
+            format = 'ORC', partitioned_by = ARRAY['dt'],
+            bucketed_by = ARRAY['sku'], bucket_count = {SKU_BUCKET_COUNT}, sorted_by = ARRAY['sku']
+        )
+        """, "setup_create_order_lines_bucketed", date_str)
+        trino_execute(cur, f"""
+        CREATE TABLE IF NOT EXISTS hive.curated.inventory_bucketed (
+            warehouse_id VARCHAR, sku VARCHAR, available_qty INTEGER, reserved_qty INTEGER, dt VARCHAR
+        ) WITH (
+            format = 'ORC', partitioned_by = ARRAY['dt'],
+            bucketed_by = ARRAY['sku'], bucket_count = {SKU_BUCKET_COUNT}, sorted_by = ARRAY['sku']
+        )
+        """, "setup_create_inventory_bucketed", date_str)
     conn.close()
 
-def run_trino_aggregation(date_str):
-    """Exécute le calcul agrégé sur Trino"""
-    conn = connect(host=TRINO_HOST, port=TRINO_PORT, user=TRINO_USER, catalog="hive", schema="default")
+def fingerprint_input_partitions(date_str):
+    """Empreinte des partitions HDFS lues par l'agrégation (fichiers, tailles, dates, checksums).
+    Renvoie None si le listing échoue : dans ce cas on ne touche pas au cache."""
+    storage = get_storage()
+    paths = [f"/raw/orders/dt={date_str}"]
+    globs = [f"{paths[0]}/*/*"]
+    if INVENTORY_SNAPSHOT_MODE == "delta":
+        # Même plage que la requête : [dernier checkpoint <= date, date]. Le listing des dossiers
+        # de partitions ne lit que des métadonnées ; seuls les fichiers de la plage sont checksummés.
+        partitions = storage.list_dirs("/raw/inventory_delta/dt=*/kind=*")
+        if partitions is None:
+            return None
+        parts = [(re.search(r"dt=([0-9-]+)/kind=(\w+)", p).groups(), p) for p in partitions]
+        parts = [(dt, kind, p) for (dt, kind), p in parts if dt <= date_str]
+        checkpoints = [dt for dt, kind, _ in parts if kind == "full"]
+        start = max(checkpoints) if checkpoints else date_str
+        inventory_paths = sorted(p for dt, _, p in parts if dt >= start)
+    else:
+        inventory_paths = [f"/raw/inventory/dt={date_str}"]
+    paths += inventory_paths
+    globs += [f"{p}/*" for p in inventory_paths]
+    lines = storage.describe_files(paths, globs)
+    if not lines:
+        return None
+    from result_cache import fingerprint
+    return fingerprint(lines)
+
+def run_trino_aggregation(date_str, skus=None):
+    """Exécute le calcul agrégé sur Trino (ou le relit depuis le cache si les entrées n'ont pas changé).
+    'skus' limite le recalcul à quelques SKU : avec BUCKETED_LAYOUT, seuls leurs buckets sont lus."""
+    fp = fingerprint_input_partitions(date_str) if RESULT_CACHE_ENABLED and not skus else None
+    if fp is not None:
+        from result_cache import cache_get
+        cached = cache_get(RESULT_CACHE_FILE, date_str, fp, RESULT_CACHE_MAX_BYTES)
+        if cached is not None:
+            print(f"Trino aggregation for {date_str} served from cache (inputs unchanged).")
+            return cached
+
+    if PIPELINE_BACKEND == "local":
+        from backends import local_aggregation
+        rows = local_aggregation(get_storage(), date_str, INVENTORY_SNAPSHOT_MODE)
+        if skus:
+            wanted = set(skus)
+            rows = [r for r in rows if r[0] in wanted]
+    else:
+        rows = _trino_aggregation(date_str, skus)
+
+    if fp is not None:
+        from result_cache import cache_put
+        cache_put(RESULT_CACHE_FILE, date_str, fp, rows, RESULT_CACHE_MAX_BYTES)
+    return rows
+
+def _trino_aggregation(date_str, skus=None):
+    conn = get_trino_connection()
     cur = conn.cursor()
-    
-    # Sync Partitions
-    cur.execute("CALL system.sync_partition_metadata('default', 'raw_orders', 'FULL')")
-    cur.execute("CALL system.sync_partition_metadata('default', 'raw_inventory', 'FULL')")
+    rows = trino_execute(cur, _aggregation_query(cur, date_str, skus), "aggregation", date_str, explain=True)
+    conn.close()
+    return rows
+
+def _sync_partitions(cur, date_str):
+    trino_execute(cur, "CALL system.sync_partition_metadata('default', 'raw_orders', 'FULL')", "sync_raw_orders", date_str)
+    trino_execute(cur, "CALL system.sync_partition_metadata('default', 'raw_inventory', 'FULL')", "sync_raw_inventory", date_str)
+    if INVENTORY_SNAPSHOT_MODE == "delta":
+        trino_execute(cur, "CALL system.sync_partition_metadata('default', 'raw_inventory_delta', 'FULL')",
+                      "sync_raw_inventory_delta", date_str)
+
+def _inventory_positions_query(cur, date_str):
+    """Requête (warehouse_id, sku, available_qty, reserved_qty) des positions du jour, typées en INT"""
+    if INVENTORY_SNAPSHOT_MODE == "delta":
+        # Checkpoint le plus récent : lu dans les métadonnées de partitions, sans scanner de fichier
+        checkpoint_dt = trino_execute(cur, f"""
+        SELECT MAX(dt) FROM "raw_inventory_delta$partitions" WHERE kind = 'full' AND dt <= '{date_str}'
+        """, "inventory_checkpoint", date_str)[0][0] or date_str
+        # Bornes littérales sur dt : Trino ne lit que les partitions [checkpoint, date]
+        return f"""
+        SELECT warehouse_id, sku, available_qty, reserved_qty
+        FROM (
+            SELECT warehouse_id, sku, available_qty, reserved_qty,
+                   ROW_NUMBER() OVER (PARTITION BY warehouse_id, sku ORDER BY dt DESC) AS rn
+            FROM raw_inventory_delta
+            WHERE dt BETWEEN '{checkpoint_dt}' AND '{date_str}'
+        )
+        WHERE rn = 1
+        """
+    return f"""
+        SELECT warehouse_id, sku, CAST(available_qty AS INT) AS available_qty, CAST(reserved_qty AS INT) AS reserved_qty
+        FROM raw_inventory
+        WHERE dt = '{date_str}'
+        """
+
+def sku_scope(conf):
+    """SKU d'un recalcul ciblé lus dans la conf du DAG run ({"skus": [...]}), None pour un run complet"""
+    skus = (conf or {}).get("skus")
+    if skus is None:
+        return None
+    if not isinstance(skus, list) or not skus or not all(isinstance(sku, str) and sku for sku in skus):
+        raise ValueError(f"'skus' must be a non-empty list of SKU strings, got {skus!r}")
+    return skus
+
+def _sql_list(values):
+    """Liste de littéraux SQL, apostrophes échappées"""
+    return ", ".join("'" + v.replace("'", "''") + "'" for v in values)
+
+def _bucketed_partition_ready(cur, date_str):
+    """Les deux tables bucketées existent et portent la partition du jour (date compactée)"""
+    tables = trino_execute(cur, """
+    SELECT COUNT(*) FROM hive.information_schema.tables
+    WHERE table_schema = 'curated' AND table_name IN ('order_lines_bucketed', 'inventory_bucketed')
+    """, "bucketed_tables", date_str)[0][0]
+    if tables < 2:
+        return False
+    counts = trino_execute(cur, f"""
+    SELECT (SELECT COUNT(*) FROM curated."order_lines_bucketed$partitions" WHERE dt = '{date_str}'),
+           (SELECT COUNT(*) FROM curated."inventory_bucketed$partitions" WHERE dt = '{date_str}')
+    """, "bucketed_partitions", date_str)[0]
+    return all(counts)
+
+def _aggregation_query(cur, date_str, skus=None):
+    """Synchronise les partitions puis renvoie la requête (sku, total_sold, total_avail, total_reserved)"""
+    sku_list = _sql_list(skus or [])
+
+    # Date jamais compactée (layout activé depuis) : on lit les tables brutes plutôt qu'un résultat vide
+    if skus and BUCKETED_LAYOUT and _bucketed_partition_ready(cur, date_str):
+        # Tables bucketées par sku : le filtre IN élimine tous les autres buckets
+        orders_query = f"""
+        SELECT sku, SUM(quantity) as total_sold
+        FROM curated.order_lines_bucketed
+        WHERE dt = '{date_str}' AND sku IN ({sku_list})
+        GROUP BY sku
+        """
+        inventory_table = "curated.inventory_bucketed"
+        inventory_filter = f"WHERE dt = '{date_str}' AND sku IN ({sku_list})"
+    else:
+        # Sync Partitions
+        _sync_partitions(cur, date_str)
+        orders_filter = f"AND t.sku IN ({sku_list})" if skus else ""
+        orders_query = f"""
+        SELECT t.sku, SUM(t.quantity) as total_sold
+        FROM raw_orders 
+        CROSS JOIN UNNEST(items) AS t(sku, quantity, unit_price)
+        WHERE dt = '{date_str}' {orders_filter}
+        GROUP BY t.sku
+        """
+        inventory_table = f"({_inventory_positions_query(cur, date_str)})"
+        inventory_filter = f"WHERE sku IN ({sku_list})" if skus else ""
     
     query = f"""
     SELECT 
@@ -260,30 +691,90 @@ def run_trino_aggregation(date_str):
         COALESCE(i.total_avail, 0) as total_avail,
         COALESCE(i.total_reserved, 0) as total_reserved
     FROM (
-        SELECT t.sku, SUM(t.quantity) as total_sold
-        FROM raw_orders 
-        CROSS JOIN UNNEST(items) AS t(sku, quantity, unit_price)
-        WHERE dt = '{date_str}'
-        GROUP BY t.sku
+        {orders_query}
     ) o
     FULL OUTER JOIN (
-        SELECT sku, SUM(CAST(available_qty AS INT)) as total_avail, SUM(CAST(reserved_qty AS INT)) as total_reserved
-        FROM raw_inventory
-        WHERE dt = '{date_str}'
+        SELECT sku, SUM(available_qty) as total_avail, SUM(reserved_qty) as total_reserved
+        FROM {inventory_table}
+        {inventory_filter}
         GROUP BY sku
     ) i ON o.sku = i.sku
     """
-    cur.execute(query)
-    return cur.fetchall()
+    return query
+
+def compact_bucketed(date_str):
+    """Réécrit les commandes (une ligne par article) et les positions d'inventaire du jour
+    dans les tables bucketées par sku et triées (BUCKETED_LAYOUT)"""
+    if not BUCKETED_LAYOUT or PIPELINE_BACKEND == "local":
+        print("Bucketed layout disabled: nothing to compact.")
+        return
+    conn = get_trino_connection()
+    cur = conn.cursor()
+    _sync_partitions(cur, date_str)
+
+    # Re-run idempotent : la partition du jour (données comprises, tables managées) est remplacée
+    trino_execute(cur, f"DELETE FROM curated.order_lines_bucketed WHERE dt = '{date_str}'", "compact_clear_orders", date_str)
+    trino_execute(cur, f"""
+    INSERT INTO curated.order_lines_bucketed
+    SELECT order_id, timestamp, t.sku, t.quantity, t.unit_price, store_id, dt
+    FROM raw_orders
+    CROSS JOIN UNNEST(items) AS t(sku, quantity, unit_price)
+    WHERE dt = '{date_str}'
+    """, "compact_orders", date_str)
+
+    trino_execute(cur, f"DELETE FROM curated.inventory_bucketed WHERE dt = '{date_str}'", "compact_clear_inventory", date_str)
+    trino_execute(cur, f"""
+    INSERT INTO curated.inventory_bucketed
+    SELECT warehouse_id, sku, available_qty, reserved_qty, '{date_str}' AS dt
+    FROM ({_inventory_positions_query(cur, date_str)})
+    """, "compact_inventory", date_str)
+    conn.close()
+    print(f"Compacted {date_str} into SKU-bucketed tables.")
+
+def run_trino_net_demand(date_str, skus=None):
+    """Calcul fédéré en une seule requête Trino : agrégation HDFS + règles Postgres (catalogue 'postgres'),
+    besoin net, arrondi au MOQ et regroupement par fournisseur.
+    Renvoie {fournisseur: [lignes de commande]} : aucune donnée intermédiaire ne transite par le worker."""
+    conn = get_trino_connection()
+    cur = conn.cursor()
+    query = f"""
+    WITH agg AS ({_aggregation_query(cur, date_str, skus)}),
+    demand AS (
+        SELECT a.sku, p.name AS product, s.name AS sup_name, r.moq,
+               GREATEST(0, a.total_sold + r.safety_stock - (a.total_avail - a.total_reserved)) AS net_demand
+        FROM agg a
+        JOIN postgres.public.products p ON p.sku = a.sku
+        JOIN postgres.public.suppliers s ON s.supplier_id = p.supplier_id
+        JOIN postgres.public.replenishment_rules r ON r.sku = a.sku
+    )
+    SELECT sup_name,
+           ARRAY_AGG(CAST(ROW(sku, product, net_demand, GREATEST(net_demand, moq))
+                          AS ROW(sku VARCHAR, product VARCHAR, net_demand BIGINT, final_order_quantity BIGINT))
+                     ORDER BY sku)
+    FROM demand
+    WHERE net_demand > 0
+    GROUP BY sup_name
+    """
+    rows = trino_execute(cur, query, "net_demand", date_str, explain=True)
+    conn.close()
+
+    return {
+        sup_name: [{"sku": i[0], "product": i[1], "net_demand": i[2], "final_order_quantity": i[3]} for i in items]
+        for sup_name, items in rows
+    }
 
-def generate_supplier_files(trino_results, date_str):
+def compute_supplier_files(date_str, skus=None):
+    """Calcule les commandes fournisseur selon NET_DEMAND_MODE et écrit les JSON.
+    'skus' limite le recalcul à ces SKU : leurs lignes sont remplacées dans les fichiers du jour."""
+    if NET_DEMAND_MODE == "federated" and PIPELINE_BACKEND != "local":
+        # Pas de cache ici : l'empreinte ne couvre pas les règles Postgres lues par la requête
+        return write_supplier_files(run_trino_net_demand(date_str, skus), date_str, skus)
+    return generate_supplier_files(run_trino_aggregation(date_str, skus), date_str, skus)
+
+def generate_supplier_files(trino_results, date_str, skus=None):
     """Génère les JSON de commande fournisseur"""
     master_data = fetch_replenishment_rules()
     
-    output_dir = f"{AIRFLOW_DATA_DIR}/supplier_orders/{date_str}"
-    if os.path.exists(output_dir): shutil.rmtree(output_dir)
-    os.makedirs(output_dir)
-    
     supplier_batches = {} 
     
     for row in trino_results:
@@ -303,6 +794,17 @@ def generate_supplier_files(trino_results, date_str):
                 "net_demand": net_demand, "final_order_quantity": qty_to_order
             })
             
+    return write_supplier_files(supplier_batches, date_str, skus)
+
+def write_supplier_files(supplier_batches, date_str, skus=None):
+    """Écrit un JSON par fournisseur : {fournisseur: [lignes de commande]}.
+    Avec 'skus' (recalcul ciblé), les lignes des autres SKU sont reprises des fichiers existants du jour."""
+    output_dir = f"{AIRFLOW_DATA_DIR}/supplier_orders/{date_str}"
+    if skus:
+        supplier_batches = _merge_supplier_batches(output_dir, supplier_batches, set(skus))
+    if os.path.exists(output_dir): shutil.rmtree(output_dir)
+    os.makedirs(output_dir)
+    
     for sup, items in supplier_batches.items():
         filename = f"Order_{sup.replace(' ', '_')}_{date_str}.json"
         with open(f"{output_dir}/{filename}", "w") as f:
@@ -310,16 +812,20 @@ def generate_supplier_files(trino_results, date_str):
             
     return output_dir
 
+def _merge_supplier_batches(output_dir, supplier_batches, skus):
+    """Lignes existantes hors 'skus' + nouvelles lignes de 'skus' (un SKU peut avoir changé de fournisseur)"""
+    merged = {}
+    if os.path.exists(output_dir):
+        for filename in sorted(os.listdir(output_dir)):
+            with open(f"{output_dir}/{filename}") as f:
+                order = json.load(f)
+            merged[order["supplier"]] = [i for i in order["items"] if i["sku"] not in skus]
+    for sup, items in supplier_batches.items():
+        merged.setdefault(sup, []).extend(items)
+    # Un fournisseur dont il ne reste aucune ligne n'a plus de fichier
+    return {sup: sorted(items, key=lambda i: i["sku"]) for sup, items in merged.items() if items}
+
 def upload_results_to_hdfs(local_dir, date_str):
     """Upload les résultats finaux"""
-    target_dir = f"/output/supplier_orders/{date_str}"
-    
-    subprocess.run(f"docker exec namenode hdfs dfs -rm -r -f {target_dir}", shell=True)
-    subprocess.run(f"docker exec namenode hdfs dfs -mkdir -p /output/supplier_orders", shell=True)
-    
-    tmp_path = f"/tmp/output_{date_str}"
-    subprocess.run(f"docker exec namenode rm -rf {tmp_path}", shell=True)
-    subprocess.run(f"docker cp \"{local_dir}\" namenode:\"{tmp_path}\"", shell=True)
-    subprocess.run(f"docker exec namenode hdfs dfs -put \"{tmp_path}\" /output/supplier_orders/{date_str}", shell=True)
-    
+    get_storage().put_dir(local_dir, f"/output/supplier_orders/{date_str}")
     print("Upload Results Complete.")
\ No newline at end of file
@@ -0,0 +1,154 @@
+import random
+
+# Détection d'anomalies en flux pour la génération des commandes.
+# L'état est de taille constante quel que soit le nombre de commandes :
+# compteurs, top-k (algorithme Space-Saving), heartbeat par magasin et
+# sketches de quantiles (échantillon réservoir). Seul le journal de détail,
+# optionnel et échantillonné, écrit les événements individuels - sur disque.
+
+SPIKE_QTY_THRESHOLD = 4
+
+class TopK:
+    """Space-Saving : les k éléments les plus fréquents avec au plus k compteurs"""
+    def __init__(self, k):
+        self.k = k
+        self.counts = {}
+
+    def add(self, key, weight=1):
+        if key in self.counts:
+            self.counts[key] += weight
+        elif len(self.counts) < self.k:
+            self.counts[key] = weight
+        else:
+            # On remplace le plus petit compteur, qui devient la borne d'erreur du nouvel élément
+            victim = min(self.counts, key=self.counts.get)
+            self.counts[key] = self.counts.pop(victim) + weight
+
+    def top(self, n=None):
+        return sorted(self.counts.items(), key=lambda kv: -kv[1])[:n or self.k]
+
+class QuantileSketch:
+    """Quantiles approchés sur un échantillon réservoir de taille fixe"""
+    def __init__(self, size=1024, seed=0):
+        self.size = size
+        self.n = 0
+        self.sample = []
+        # RNG dédié : ne perturbe pas le flux aléatoire de la génération
+        self._rng = random.Random(seed)
+
+    def add(self, value):
+        self.n += 1
+        if len(self.sample) < self.size:
+            self.sample.append(value)
+        else:
+            j = self._rng.randrange(self.n)
+            if j < self.size:
+                self.sample[j] = value
+
+    def quantile(self, q):
+        if not self.sample:
+            return None
+        ordered = sorted(self.sample)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+class StreamingAnomalyDetector:
+    def __init__(self, stores, top_k=10, detail_log=None, detail_sample_rate=0.01, detail_max_lines=10000):
+        self.orders = 0
+        self.lines = 0
+        self.spike_lines = 0
+        self.spike_units = 0
+        # Space-Saving est exact en tête de classement si on garde plus de compteurs qu'on n'en affiche
+        self.top_k = top_k
+        self.top_skus = TopK(top_k * 5)
+        self.top_stores = TopK(top_k * 5)
+        # Heartbeat : {store_id: [nb_commandes, index première commande, index dernière commande]}
+        self.heartbeats = {sid: [0, None, None] for sid in stores}
+        self.qty_sketch = QuantileSketch(seed=1)
+        self.order_value_sketch = QuantileSketch(seed=2)
+
+        self.detail_log = detail_log
+        self.detail_sample_rate = detail_sample_rate
+        self.detail_max_lines = detail_max_lines
+        self.detail_lines = 0
+        self._detail_rng = random.Random(3)
+
+    def __getstate__(self):
+        # Le journal de détail est un fichier ouvert : il est rouvert par l'appelant à la reprise
+        state = dict(self.__dict__)
+        state["detail_log"] = None
+        return state
+
+    def observe_order(self, order_index, store, items):
+        self.orders += 1
+        hb = self.heartbeats.setdefault(store, [0, None, None])
+        hb[0] += 1
+        if hb[1] is None:
+            hb[1] = order_index
+        hb[2] = order_index
+
+        value = 0.0
+        for item in items:
+            qty = item["quantity"]
+            self.lines += 1
+            self.qty_sketch.add(qty)
+            value += qty * item["unit_price"]
+
+            # EXCEPTION CHECK: Spike detection
+            if qty > SPIKE_QTY_THRESHOLD:
+                self.spike_lines += 1
+                self.spike_units += qty
+                self.top_skus.add(item["sku"], qty)
+                self.top_stores.add(store, qty)
+                self._log_detail(f"WARNING: Demand Spike detected. Order {order_index} for {item['sku']} has qty {qty}.")
+        self.order_value_sketch.add(value)
+
+    def _log_detail(self, message):
+        if self.detail_log is None or self.detail_lines >= self.detail_max_lines:
+            return
+        if self._detail_rng.random() < self.detail_sample_rate:
+            self.detail_log.write(f"[!] {message}\n")
+            self.detail_lines += 1
+
+    def missing_stores(self):
+        return [sid for sid, hb in self.heartbeats.items() if hb[0] == 0]
+
+    def has_anomalies(self):
+        return self.spike_lines > 0 or bool(self.missing_stores())
+
+    def write_report(self, f, date_str):
+        f.write(f" GENERATION REPORT: {date_str} ---\n")
+        f.write(f"Status: {'WARNING' if self.has_anomalies() else 'SUCCESS'}\n")
+        f.write(f"Processed Orders: {self.orders}\n")
+        f.write(f"Processed Lines: {self.lines}\n")
+        if not self.has_anomalies():
+            f.write("No data generation anomalies detected.\n")
+            return
+
+        f.write("DETECTED ANOMALIES:\n")
+        # EXCEPTION CHECK: Did any store fail to report?
+        for sid in self.missing_stores():
+            f.write(f"[!] CRITICAL: Missing POS files for {sid}. No orders received.\n")
+        if self.spike_lines:
+            share = 100.0 * self.spike_lines / self.lines
+            f.write(f"[!] WARNING: {self.spike_lines} demand spike lines (qty > {SPIKE_QTY_THRESHOLD}), "
+                    f"{share:.1f}% of lines, {self.spike_units} units.\n")
+            f.write("Top spiking SKUs (units):\n")
+            for sku, units in self.top_skus.top(self.top_k):
+                f.write(f"    {sku}: {units}\n")
+            f.write("Top spiking stores (units):\n")
+            for sid, units in self.top_stores.top(self.top_k):
+                f.write(f"    {sid}: {units}\n")
+
+        if self.lines:
+            f.write("Line quantity quantiles (p50/p90/p99): "
+                    f"{self.qty_sketch.quantile(0.5)}/{self.qty_sketch.quantile(0.9)}/{self.qty_sketch.quantile(0.99)}\n")
+            f.write("Order value quantiles (p50/p90/p99): "
+                    f"{self.order_value_sketch.quantile(0.5):.2f}/{self.order_value_sketch.quantile(0.9):.2f}/"
+                    f"{self.order_value_sketch.quantile(0.99):.2f}\n")
+        # Seuls les magasins les moins actifs sont listés : le rapport reste court à 10k magasins
+        f.write("Least active stores (orders, first/last order index):\n")
+        quietest = sorted(self.heartbeats.items(), key=lambda kv: kv[1][0])[:self.top_k]
+        for sid, (count, first, last) in quietest:
+            f.write(f"    {sid}: {count} ({first}/{last})\n")
+        if self.detail_log is not None:
+            f.write(f"Sampled detail log: {self.detail_lines} lines (rate {self.detail_sample_rate}).\n")
@@ -0,0 +1,107 @@
+import os
+import sys
+import json
+import argparse
+import tempfile
+import subprocess
+import importlib.util
+
+# --- CONFIGURATION ---
+DAGS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "dags")
+DAG_FILE = os.path.join(DAGS_DIR, "supply_chain_dag.py")
+
+# Modules qui ne doivent jamais être chargés pendant le parsing du DAG
+HEAVY_MODULES = ["psycopg2", "faker", "trino", "utils"]
+
+# Fan-out ajouté à la fin d'une copie de supply_chain_dag.py : une tâche par magasin /
+# fournisseur, avec le même motif de callable paresseux, branchée derrière setup_hive_tables.
+# On mesure ainsi le vrai fichier DAG tel qu'il serait s'il grossissait de N tâches.
+FANOUT_CODE = r'''
+
+with dag:
+    for _i in range({n_tasks}):
+        def _task_store(store_id=f"STORE-{{_i:05d}}", **kwargs):
+            from utils import generate_and_process
+            generate_and_process(kwargs["ds"])
+        t_setup >> PythonOperator(task_id=f"generate_store_{{_i:05d}}", python_callable=_task_store)
+'''
+
+# Code exécuté dans un interpréteur neuf (comme un processus de parsing du scheduler).
+# Airflow est importé AVANT la mesure : il est déjà chargé dans le scheduler,
+# seul le coût propre à notre fichier DAG nous intéresse.
+CHILD_CODE = r'''
+import sys, json, time, runpy
+dags_dir, dag_file, fanout_file, heavy = sys.argv[1], sys.argv[2], sys.argv[3], sys.argv[4].split(",")
+sys.path.insert(0, dags_dir)
+
+from airflow import DAG
+from airflow.operators.python import PythonOperator
+
+t0 = time.perf_counter()
+runpy.run_path(dag_file)
+dag_parse = time.perf_counter() - t0
+
+t0 = time.perf_counter()
+runpy.run_path(fanout_file)
+fanout_parse = time.perf_counter() - t0
+
+leaked = [m for m in heavy if m in sys.modules]
+print(json.dumps({"dag_parse": dag_parse, "fanout_parse": fanout_parse, "leaked": leaked}))
+'''
+
+def write_fanout_dag(directory, n_tasks):
+    """Copie de supply_chain_dag.py augmentée de n_tasks tâches"""
+    with open(DAG_FILE, encoding="utf-8") as f:
+        source = f.read()
+    path = os.path.join(directory, "supply_chain_dag_fanout.py")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(source + FANOUT_CODE.format(n_tasks=n_tasks))
+    return path
+
+def run_once(fanout_file):
+    out = subprocess.run(
+        [sys.executable, "-c", CHILD_CODE, DAGS_DIR, DAG_FILE, fanout_file, ",".join(HEAVY_MODULES)],
+        capture_output=True, text=True, check=True
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark du temps de parsing de supply_chain_dag.py")
+    parser.add_argument("--tasks", type=int, default=1000, help="Tâches par magasin/fournisseur ajoutées au DAG")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget", type=float, default=0.25, help="Budget (s) pour le parsing de supply_chain_dag.py")
+    parser.add_argument("--fanout-budget", type=float, default=2.0, help="Budget (s) pour le DAG augmenté de --tasks tâches")
+    args = parser.parse_args()
+
+    # Le parsing n'a de sens qu'avec la version d'Airflow du scheduler (image Docker du projet)
+    if importlib.util.find_spec("airflow") is None:
+        print("❌ Airflow n'est pas installé : lancer ce benchmark dans le conteneur Airflow.")
+        sys.exit(2)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        fanout_file = write_fanout_dag(tmp, args.tasks)
+        results = [run_once(fanout_file) for _ in range(args.runs)]
+    # On garde le meilleur run : le bruit de la machine ne fait qu'ajouter du temps
+    dag_parse = min(r["dag_parse"] for r in results)
+    fanout_parse = min(r["fanout_parse"] for r in results)
+    leaked = sorted({m for r in results for m in r["leaked"]})
+
+    print(f"- supply_chain_dag.py : {dag_parse * 1000:.1f} ms (budget {args.budget * 1000:.0f} ms)")
+    print(f"- supply_chain_dag.py + {args.tasks} tâches : {fanout_parse * 1000:.1f} ms (budget {args.fanout_budget * 1000:.0f} ms)")
+
+    failures = []
+    if leaked:
+        failures.append(f"Modules lourds chargés au parsing : {', '.join(leaked)}")
+    if dag_parse > args.budget:
+        failures.append("Budget de parsing du DAG dépassé")
+    if fanout_parse > args.fanout_budget:
+        failures.append("Budget de parsing du DAG augmenté dépassé")
+
+    for f in failures:
+        print(f"❌ {f}")
+    if failures:
+        sys.exit(1)
+    print("✅ Parsing within budget.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+import os
+import sys
+import shutil
+import hashlib
+import argparse
+import tempfile
+import subprocess
+
+# Vérifie qu'une génération interrompue puis reprise produit exactement les mêmes
+# fichiers qu'une génération sans échec, pour le DAG (dags/utils.py, backend local)
+# et pour scripts/generate_orders.py. Chaque essai tourne dans un interpréteur neuf,
+# comme un retry Airflow : la reprise ne s'appuie que sur ce qui est sur disque.
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+DAGS_DIR = os.path.join(SCRIPTS_DIR, "..", "dags")
+
+# Dossiers de travail qui ne font pas partie de la sortie
+IGNORED_DIRS = {"checkpoints", "local_db"}
+
+CRASH_EXIT_CODE = 3
+
+CHILD_CODE = r'''
+import os, sys
+scripts_dir, dags_dir, target, data_dir, date_str = sys.argv[1:6]
+orders, chunk, crash_chunk = map(int, sys.argv[6:9])
+os.environ.update(PIPELINE_BACKEND="local", PROCUREMENT_DATA_DIR=data_dir,
+                  ORDERS_PER_DAY=str(orders), GENERATION_CHUNK_ORDERS=str(chunk))
+sys.path[:0] = [scripts_dir, dags_dir]
+from partition_writer import PartitionWriter
+
+class SimulatedCrash(Exception):
+    pass
+
+if crash_chunk >= 0:
+    # Le chunk visé s'arrête à mi-parcours, après avoir vidé une partie de ses lignes sur disque
+    crash_after = crash_chunk * chunk + chunk // 2
+    original_write = PartitionWriter.write
+    written = [0]
+    def crashing_write(self, key, line):
+        written[0] += 1
+        if written[0] > crash_after:
+            self.close()
+            raise SimulatedCrash()
+        original_write(self, key, line)
+    PartitionWriter.write = crashing_write
+
+if target == "dag":
+    import utils
+    utils.seed_database()
+    generate = lambda: utils.generate_and_process(date_str)
+else:
+    import generate_orders
+    from catalog import get_catalog
+    generate_orders.LOCAL_OUTPUT_DIR = data_dir
+    generate_orders.ORDERS_PER_DAY = orders
+    _, products, stores = get_catalog()
+    products = {p[0]: {"name": p[1], "price": p[2]} for p in products}
+    stores = [s[0] for s in stores]
+    generate = lambda: generate_orders.generate_and_process(products, stores, date_str)
+
+try:
+    generate()
+except SimulatedCrash:
+    sys.exit(%d)
+''' % CRASH_EXIT_CODE
+
+def run_child(target, data_dir, args, crash_chunk=-1):
+    return subprocess.run(
+        [sys.executable, "-c", CHILD_CODE, SCRIPTS_DIR, DAGS_DIR, target, data_dir, args.date,
+         str(args.orders), str(args.chunk), str(crash_chunk)],
+        capture_output=True, text=True
+    )
+
+def hash_tree(root):
+    """{chemin relatif: sha256} de tous les fichiers produits"""
+    hashes = {}
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [d for d in dirnames if d not in IGNORED_DIRS]
+        for name in filenames:
+            path = os.path.join(dirpath, name)
+            with open(path, "rb") as f:
+                hashes[os.path.relpath(path, root)] = hashlib.sha256(f.read()).hexdigest()
+    return hashes
+
+def check(target, args, tmp):
+    clean_dir, resumed_dir = os.path.join(tmp, f"{target}_clean"), os.path.join(tmp, f"{target}_resumed")
+
+    clean = run_child(target, clean_dir, args)
+    if clean.returncode != 0:
+        return [f"clean run failed:\n{clean.stderr}"]
+    crashed = run_child(target, resumed_dir, args, crash_chunk=args.crash_chunk)
+    if crashed.returncode != CRASH_EXIT_CODE:
+        return [f"crash was not triggered at chunk {args.crash_chunk} (exit {crashed.returncode}):\n{crashed.stderr}"]
+    resumed = run_child(target, resumed_dir, args)
+    if resumed.returncode != 0:
+        return [f"resumed run failed:\n{resumed.stderr}"]
+    if "Resuming" not in resumed.stdout:
+        return ["retry started from scratch instead of resuming from the checkpoint"]
+
+    expected = hash_tree(clean_dir)
+    failures = compare(expected, hash_tree(resumed_dir), "resumed")
+
+    # Sortie supprimée après un run terminé : le checkpoint ne doit pas faire sauter la génération
+    shutil.rmtree(os.path.join(resumed_dir, "orders"))
+    rerun = run_child(target, resumed_dir, args)
+    if rerun.returncode != 0:
+        return failures + [f"re-run after deleting orders failed:\n{rerun.stderr}"]
+    failures += compare(expected, hash_tree(resumed_dir), "re-run after deleting orders")
+    print(f"- {target}: {len(expected)} files compared")
+    return failures
+
+def compare(expected, actual, scenario):
+    return [f"{path}: {scenario} differs from clean run" for path in sorted(set(expected) | set(actual))
+            if expected.get(path) != actual.get(path)]
+
+def main():
+    parser = argparse.ArgumentParser(description="Génération interrompue + reprise == génération sans échec")
+    parser.add_argument("--date", default="2026-01-05")
+    parser.add_argument("--orders", type=int, default=20000)
+    parser.add_argument("--chunk", type=int, default=3000, help="GENERATION_CHUNK_ORDERS")
+    parser.add_argument("--crash-chunk", type=int, default=3, help="Chunk interrompu à mi-parcours")
+    parser.add_argument("--target", choices=["dag", "script", "all"], default="all")
+    args = parser.parse_args()
+
+    targets = ["dag", "script"] if args.target == "all" else [args.target]
+    failures = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for target in targets:
+            failures += [f"{target}: {f}" for f in check(target, args, tmp)]
+
+    for f in failures:
+        print(f"❌ {f}")
+    if failures:
+        sys.exit(1)
+    print("✅ Resumed generation is byte-identical to a clean run.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,27 @@
+import os
+import sys
+import argparse
+
+# Génère un catalogue synthétique (fournisseurs, SKU, magasins/entrepôts) et l'écrit
+# en CSV, un fichier par table Postgres, chargeable tel quel avec COPY :
+#   \copy products FROM 'products.csv' WITH (FORMAT csv)
+# Pour seeder directement la base, utiliser plutôt les variables CATALOG_* avec seed_database.
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "dags"))
+from catalog import generate_catalog, write_catalog_csv
+
+def main():
+    parser = argparse.ArgumentParser(description="Catalogue synthétique pour les tests de charge")
+    parser.add_argument("--suppliers", type=int, default=50)
+    parser.add_argument("--skus", type=int, default=10000)
+    parser.add_argument("--stores", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="./generated_data/catalog")
+    args = parser.parse_args()
+
+    suppliers, products, stores = generate_catalog(args.suppliers, args.skus, args.stores, seed=args.seed)
+    write_catalog_csv(suppliers, products, stores, args.out)
+    print(f" Catalog written to {args.out}: {len(suppliers)} suppliers, {len(products)} SKUs, {len(stores)} stores.")
+
+if __name__ == "__main__":
+    main()
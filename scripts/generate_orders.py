@@ -8,6 +8,13 @@ import shutil
 import sys
 from datetime import datetime
 from faker import Faker
+from anomaly_detector import StreamingAnomalyDetector
+
+# Les modules partagés avec le DAG vivent dans dags/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "dags"))
+from partition_writer import PartitionWriter
+from generation_checkpoint import GenerationCheckpoint
+from catalog import get_catalog, catalog_tables, bulk_insert
 
 # --- CONFIGURATION ---
 def get_db_host():
@@ -27,43 +34,22 @@ DATE_TO_GENERATE = datetime.now().strftime("%Y-%m-%d")
 LOCAL_OUTPUT_DIR = "./generated_data" if os.name == 'nt' else "/app/generated_data"
 fake = Faker()
 
+# Journal de détail des anomalies (échantillonné, optionnel) en plus du rapport résumé
+EXCEPTION_DETAIL_LOG = os.environ.get("EXCEPTION_DETAIL_LOG", "0") == "1"
+EXCEPTION_DETAIL_SAMPLE_RATE = float(os.environ.get("EXCEPTION_DETAIL_SAMPLE_RATE", "0.01"))
+
+# Écriture des partitions de commandes : fichiers ouverts simultanément et plafond mémoire des buffers
+PARTITION_MAX_OPEN_FILES = int(os.environ.get("PARTITION_MAX_OPEN_FILES", 256))
+PARTITION_BLOCK_BYTES = int(os.environ.get("PARTITION_BLOCK_BYTES", 1024 * 1024))
+PARTITION_MEMORY_LIMIT = int(os.environ.get("PARTITION_MEMORY_LIMIT", 64 * 1024 * 1024))
+
+# Génération reprenable : taille d'un chunk (coût maximal d'un retry) et graine du RNG
+GENERATION_CHUNK_ORDERS = int(os.environ.get("GENERATION_CHUNK_ORDERS", 100000))
+GENERATION_SEED = os.environ.get("GENERATION_SEED", "0")
+
 # --- MASTER DATA ---
-SUPPLIERS = [
-    ("SUP-001", "Les Eaux Minérales d'Oulmès", "Casablanca"),
-    ("SUP-002", "Centrale Danone", "Casablanca"),
-    ("SUP-003", "Dari Couspate", "Salé"),
-    ("SUP-004", "Cosumar", "Casablanca"),
-    ("SUP-005", "Dislog Group", "Casablanca")
-]
-
-MOROCCAN_PRODUCTS = [
-    # SKU, Name, Price, SupplierID, SafetyStock, MOQ
-    ("PRD-001", "Sidi Ali 1.5L", 6.50, "SUP-001", 100, 50),
-    ("PRD-002", "Oulmes 1L", 7.00, "SUP-001", 80, 40),
-    ("PRD-003", "Couscous Dari 1kg", 13.50, "SUP-003", 50, 20),
-    ("PRD-004", "Thé Sultan Vert", 18.00, "SUP-004", 60, 20),
-    ("PRD-005", "Aicha Confiture Fraise", 22.00, "SUP-005", 30, 10),
-    ("PRD-006", "Lait Centrale Danone", 3.50, "SUP-002", 200, 100),
-    ("PRD-007", "Raibi Jamila", 2.50, "SUP-002", 250, 100),
-    ("PRD-008", "Huile d'Olive Al Horra", 65.00, "SUP-005", 20, 10),
-    ("PRD-009", "Fromage La Vache Qui Rit", 15.00, "SUP-005", 40, 20),
-    ("PRD-010", "Merendina", 2.00, "SUP-005", 300, 50),
-    ("PRD-011", "Pasta Tria", 8.00, "SUP-003", 60, 20),
-    ("PRD-012", "Sardines Titus", 5.50, "SUP-005", 80, 20),
-    ("PRD-013", "Coca-Cola 1L", 9.00, "SUP-005", 150, 30),
-    ("PRD-014", "Atay Sebou", 14.00, "SUP-004", 50, 10),
-    ("PRD-015", "Eau Ciel 5L", 12.00, "SUP-005", 40, 10)
-]
-
-STORES = [
-    ("STORE-CAS-01", "Marjane Californie"), 
-    ("STORE-CAS-02", "Morocco Mall"), 
-    ("STORE-RAB-01", "Marjane Hay Riad"), 
-    ("STORE-TNG-01", "Socco Alto"), 
-    ("STORE-MAR-01", "Menara Mall"), 
-    ("STORE-AGA-01", "Carrefour Agadir"), 
-    ("STORE-FES-01", "Borj Fez")
-]
+# Catalogue partagé avec le DAG (dags/catalog.py) : démo par défaut,
+# catalogue généré si CATALOG_SUPPLIERS / CATALOG_SKUS / CATALOG_STORES sont définis.
 
 def get_db_connection():
     try: return psycopg2.connect(**DB_PARAMS)
@@ -72,27 +58,21 @@ def get_db_connection():
         sys.exit(1)
 
 def seed_database(conn):
-    print("Seeding Database...")
+    suppliers, products, stores = get_catalog()
+    print(f"Seeding Database ({len(suppliers)} suppliers, {len(products)} SKUs, {len(stores)} stores)...")
     with conn.cursor() as cur:
         for t in ["replenishment_rules", "products", "suppliers", "warehouses", "stores"]: 
             cur.execute(f"DROP TABLE IF EXISTS {t} CASCADE")
         
         cur.execute("CREATE TABLE suppliers (supplier_id VARCHAR(50) PRIMARY KEY, name VARCHAR(100), city VARCHAR(50))")
-        for s in SUPPLIERS: cur.execute("INSERT INTO suppliers VALUES (%s, %s, %s)", s)
-        
         cur.execute("CREATE TABLE products (sku VARCHAR(50) PRIMARY KEY, name VARCHAR(100), price DECIMAL(10,2), supplier_id VARCHAR(50))")
-        for p in MOROCCAN_PRODUCTS: cur.execute("INSERT INTO products VALUES (%s, %s, %s, %s)", (p[0], p[1], p[2], p[3]))
-        
         cur.execute("CREATE TABLE replenishment_rules (sku VARCHAR(50) PRIMARY KEY, safety_stock INT, moq INT)")
-        for p in MOROCCAN_PRODUCTS: cur.execute("INSERT INTO replenishment_rules VALUES (%s, %s, %s)", (p[0], p[4], p[5]))
-        
         cur.execute("CREATE TABLE warehouses (warehouse_id VARCHAR(50) PRIMARY KEY, store_id VARCHAR(50))")
-        
         cur.execute("CREATE TABLE stores (store_id VARCHAR(50) PRIMARY KEY, name VARCHAR(100))")
         
-        for s in STORES: 
-            cur.execute("INSERT INTO warehouses VALUES (%s, %s)", (f"WH-{s[0]}", s[0]))
-            cur.execute("INSERT INTO stores VALUES (%s, %s)", (s[0], s[1]))
+        # Chargement en masse : un COPY par table au lieu d'un INSERT par ligne
+        for table, rows in catalog_tables(suppliers, products, stores).items():
+            bulk_insert(cur, table, rows)
             
         conn.commit()
 
@@ -107,7 +87,17 @@ def fetch_master_data(conn):
 
 def generate_and_process(products, stores, date_str):
     print(f"- Generating Raw Data (Orders & Inventory) for {date_str}...")
-    if os.path.exists(LOCAL_OUTPUT_DIR):
+    skus = list(products.keys())
+    n_chunks = max(1, -(-ORDERS_PER_DAY // GENERATION_CHUNK_ORDERS))
+    checkpoint = GenerationCheckpoint(
+        f"{LOCAL_OUTPUT_DIR}/checkpoints/generation/dt={date_str}",
+        {"orders": ORDERS_PER_DAY, "chunk": GENERATION_CHUNK_ORDERS, "seed": GENERATION_SEED,
+         "stores": stores, "skus": skus, "prices": [products[sku]['price'] for sku in skus]}
+    )
+    state = checkpoint.load()
+
+    # Le dossier n'est vidé qu'au démarrage à zéro : un retry conserve les chunks déjà écrits
+    if state is None and os.path.exists(LOCAL_OUTPUT_DIR):
         for filename in os.listdir(LOCAL_OUTPUT_DIR):
             file_path = os.path.join(LOCAL_OUTPUT_DIR, filename)
             try:
@@ -117,48 +107,71 @@ def generate_and_process(products, stores, date_str):
                     shutil.rmtree(file_path)
             except Exception as e:
                 print(f" Failed to delete {file_path}. Reason: {e}")
-    else:
-        os.makedirs(LOCAL_OUTPUT_DIR)
+    os.makedirs(LOCAL_OUTPUT_DIR, exist_ok=True)
     
-    # 1. Initialize Exception Tracking
-    exceptions = []
+    # 1. Initialize Exception Tracking (état de taille constante)
+    base_path_logs = f"{LOCAL_OUTPUT_DIR}/logs/exceptions"
+    os.makedirs(base_path_logs, exist_ok=True)
+    detail_path = f"{base_path_logs}/details_{date_str}.txt"
+    rng = random.Random(f"{date_str}:{GENERATION_SEED}")
+    if state is None:
+        first_chunk = 0
+        sales_counts = {sku: 0 for sku in products} 
+        detail_log = open(detail_path, "w") if EXCEPTION_DETAIL_LOG else None
+        detector = StreamingAnomalyDetector(stores, detail_log=detail_log, detail_sample_rate=EXCEPTION_DETAIL_SAMPLE_RATE)
+    else:
+        first_chunk = state["chunk"] + 1
+        rng.setstate(state["rng"])
+        sales_counts = state["sales_counts"]
+        detector = state["detector"]
+        detail_log = None
+        if state["detail_offset"] is not None:
+            # On coupe les lignes écrites par le chunk interrompu
+            detail_log = open(detail_path, "r+")
+            detail_log.truncate(state["detail_offset"])
+            detail_log.seek(state["detail_offset"])
+        detector.detail_log = detail_log
+        if state["complete"]:
+            print("- Orders already generated (checkpoint verified on disk).")
+        else:
+            print(f"- Resuming at chunk {first_chunk}/{n_chunks}.")
     
     # --- 2. Generate Orders (JSON) ---
+    # Un fichier par partition pour toute la journée : un retry tronque chaque fichier à l'offset du dernier chunk terminé
     base_path_orders = f"{LOCAL_OUTPUT_DIR}/orders/dt={date_str}"
-    sales_counts = {sku: 0 for sku in products} 
-    files = {}
-    active_stores = set()
-
-    for sid in stores:
-        p = f"{base_path_orders}/store_id={sid}"
-        os.makedirs(p, exist_ok=True)
-        files[sid] = open(f"{p}/orders.json", "w", encoding="utf-8")
-
-    skus = list(products.keys())
-    for i in range(ORDERS_PER_DAY):
-        store = random.choice(stores)
-        active_stores.add(store)
-        items = []
-        for _ in range(random.randint(1, 3)):
-            sku = random.choice(skus)
-            qty = random.randint(1, 5)
+    writer = PartitionWriter(
+        base_path_orders, "orders.json", partitions=[f"store_id={sid}" for sid in stores],
+        max_open_files=PARTITION_MAX_OPEN_FILES, block_size=PARTITION_BLOCK_BYTES, memory_limit=PARTITION_MEMORY_LIMIT,
+        offsets=state["offsets"] if state is not None else None
+    )
+    for chunk in range(first_chunk, n_chunks):
+        fake.seed_instance(rng.getrandbits(64))
+        for i in range(chunk * GENERATION_CHUNK_ORDERS, min(ORDERS_PER_DAY, (chunk + 1) * GENERATION_CHUNK_ORDERS)):
+            store = rng.choice(stores)
+            items = []
+            for _ in range(rng.randint(1, 3)):
+                sku = rng.choice(skus)
+                qty = rng.randint(1, 5)
+                sales_counts[sku] += qty
+                items.append({"sku": sku, "quantity": qty, "unit_price": products[sku]['price']})
             
-            # EXCEPTION CHECK: Spike detection
-            if qty > 4: 
-                exceptions.append(f"WARNING: Demand Spike detected. Order {i} for {sku} has qty {qty}.")
-                
-            sales_counts[sku] += qty
-            items.append({"sku": sku, "quantity": qty, "unit_price": products[sku]['price']})
-        
-        order = {"order_id": fake.uuid4(), "timestamp": f"{date_str}T{fake.time()}", "items": items}
-        files[store].write(json.dumps(order) + '\n')
+            detector.observe_order(i, store, items)
+            # Heure tirée du RNG : fake.time() dépend de l'horloge, une reprise ne serait plus identique
+            secs = rng.randrange(86400)
+            order = {"order_id": fake.uuid4(), "timestamp": f"{date_str}T{secs // 3600:02d}:{secs // 60 % 60:02d}:{secs % 60:02d}", "items": items}
+            writer.write(f"store_id={store}", json.dumps(order) + '\n')
+
+        if detail_log is not None: detail_log.flush()
+        offsets = writer.checkpoint()
+        files = {writer.path(k): size for k, size in offsets.items()}
+        if detail_log is not None: files[detail_path] = detail_log.tell()
+        checkpoint.save(chunk, {
+            "rng": rng.getstate(), "sales_counts": sales_counts, "detector": detector, "offsets": offsets,
+            "detail_offset": detail_log.tell() if detail_log is not None else None
+        }, files=files, complete=chunk == n_chunks - 1)
+    writer.close()
     
-    for f in files.values(): f.close()
-
-    # EXCEPTION CHECK: Did any store fail to report?
-    for sid in stores:
-        if sid not in active_stores:
-            exceptions.append(f"CRITICAL: Missing POS files for {sid}. No orders received.")
+    if detail_log is not None: detail_log.close()
 
     # --- 3. Generate Inventory (CSV) ---
     base_path_inv = f"{LOCAL_OUTPUT_DIR}/inventory/dt={date_str}"
@@ -172,30 +185,18 @@ def generate_and_process(products, stores, date_str):
             for sku in skus:
                 store_sales_share = sales_counts[sku] // len(stores)
                 
-                if random.random() > 0.5:
-                    start_stock = store_sales_share + random.randint(10, 50)
+                if rng.random() > 0.5:
+                    start_stock = store_sales_share + rng.randint(10, 50)
                 else:
-                    start_stock = max(0, store_sales_share - random.randint(0, 5))
+                    start_stock = max(0, store_sales_share - rng.randint(0, 5))
                 
-                reserved = random.randint(0, 2)
+                reserved = rng.randint(0, 2)
                 writer.writerow([wh_id, sku, start_stock, reserved])
 
     # --- 4. Exception Report ---
-    
-    base_path_logs = f"{LOCAL_OUTPUT_DIR}/logs/exceptions"
-    os.makedirs(base_path_logs, exist_ok=True)
     report_file = f"{base_path_logs}/report_{date_str}.txt"
-    
     with open(report_file, "w") as f:
-        f.write(f" GENERATION REPORT: {date_str} ---\n")
-        f.write(f"Status: {'SUCCESS' if not exceptions else 'WARNING'}\n")
-        f.write(f"Processed Orders: {ORDERS_PER_DAY}\n")
-        if exceptions:
-            f.write("DETECTED ANOMALIES:\n")
-            for e in exceptions:
-                f.write(f"[!] {e}\n")
-        else:
-            f.write("No data generation anomalies detected.\n")
+        detector.write_report(f, date_str)
 
     return base_path_orders, base_path_inv, base_path_logs
 